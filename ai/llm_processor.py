@@ -1,33 +1,38 @@
 from langchain_groq import ChatGroq
-from langchain.schema import HumanMessage, SystemMessage
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List, Dict, Any, Optional
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import os
 from dotenv import load_dotenv
-import json
+import asyncio
+import diskcache
+import hashlib
+import httpx
+import ijson
+import orjson
+import threading
+import tiktoken
 
 load_dotenv()
 
-class LLMProcessor:
-    def __init__(self):
-        self.groq_api_key = os.getenv("GROQ_API_KEY")
-        if not self.groq_api_key:
-            raise ValueError("GROQ_API_KEY not found in environment variables")
-        
-        self.llm = ChatGroq(
-            groq_api_key=self.groq_api_key,
-            model_name="llama3-70b-8192",
-            temperature=0.1
-        )
-        
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-        )
-    
-    def generate_summary(self, paper_content: str, title: str = "") -> str:
-        system_prompt = """You are an expert research assistant. Create a comprehensive summary of the research paper that includes:
+# Per-paper generation calls that agenerate_all can issue together
+GENERATION_TASKS = ("summary", "study_notes", "flashcards", "mind_map")
+
+# How much paper content each prompt may carry, in tokens
+CONTENT_TOKEN_BUDGETS = {
+    "summary": 3000,
+    "study_notes": 2200,
+    "flashcards": 2200,
+    "mind_map": 2200,
+    "flashcards_batch_per_paper": 1200,
+    "insights_per_paper": 400,
+    "study_plan_per_paper": 50,
+}
+
+# System prompts are fixed per task, so LLMProcessor builds their messages once
+SUMMARY_SYSTEM_PROMPT = """You are an expert research assistant. Create a comprehensive summary of the research paper that includes:
         1. Main research question or objective
         2. Key methodology used
         3. Major findings and results
@@ -35,29 +40,8 @@ class LLMProcessor:
         5. Limitations (if mentioned)
         
         Make the summary clear, concise, and accessible to someone familiar with the research domain."""
-        
-        user_prompt = f"""Please summarize this research paper:
-        
-        Title: {title}
-        
-        Content: {paper_content[:4000]}...
-        
-        Provide a structured summary covering the key aspects mentioned in the instructions."""
-        
-        try:
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ]
-            
-            response = self.llm.invoke(messages)
-            return response.content
-        except Exception as e:
-            return f"Error generating summary: {str(e)}"
-    
-    def generate_study_notes(self, paper_content: str, title: str = "") -> Dict[str, Any]:
-        """Generate structured study notes"""
-        system_prompt = """You are an expert study assistant. Create structured study notes that help students learn and remember the key concepts from this research paper. 
+
+STUDY_NOTES_SYSTEM_PROMPT = """You are an expert study assistant. Create structured study notes that help students learn and remember the key concepts from this research paper. 
         
         Format your response as a JSON object with the following structure:
         {
@@ -67,39 +51,8 @@ class LLMProcessor:
             "takeaways": ["takeaway1", "takeaway2", ...],
             "study_questions": ["question1", "question2", ...]
         }"""
-        
-        user_prompt = f"""Create study notes for this research paper:
-        
-        Title: {title}
-        Content: {paper_content[:3000]}...
-        
-        Focus on the most important concepts that a student should understand and remember."""
-        
-        try:
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ]
-            
-            response = self.llm.invoke(messages)
-            # Try to parse JSON response
-            try:
-                return json.loads(response.content)
-            except json.JSONDecodeError:
-                # If JSON parsing fails, return structured text
-                return {
-                    "key_concepts": [],
-                    "main_points": [response.content],
-                    "important_definitions": {},
-                    "takeaways": [],
-                    "study_questions": []
-                }
-        except Exception as e:
-            return {"error": f"Error generating study notes: {str(e)}"}
-    
-    def generate_flashcards(self, paper_content: str, title: str = "", num_cards: int = 10) -> List[Dict[str, str]]:
-        """Generate flashcards for active recall"""
-        system_prompt = f"""You are an expert educator. Create {num_cards} flashcards for active recall and spaced repetition based on this research paper.
+
+FLASHCARDS_SYSTEM_PROMPT = """You are an expert educator. Create {num_cards} flashcards for active recall and spaced repetition based on this research paper.
         
         Format your response as a JSON array of objects with this structure:
         [
@@ -109,40 +62,8 @@ class LLMProcessor:
         ]
         
         Make questions clear and answers concise but complete. Include a mix of difficulties and categories."""
-        
-        user_prompt = f"""Create flashcards for this research paper:
-        
-        Title: {title}
-        Content: {paper_content[:3000]}...
-        
-        Focus on key concepts, definitions, methods, and findings that students should memorize."""
-        
-        try:
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ]
-            
-            response = self.llm.invoke(messages)
-            # Try to parse JSON response
-            try:
-                return json.loads(response.content)
-            except json.JSONDecodeError:
-                # If JSON parsing fails, create basic flashcards
-                return [
-                    {
-                        "question": "What is the main contribution of this paper?",
-                        "answer": response.content[:200],
-                        "difficulty": "medium",
-                        "category": "concept"
-                    }
-                ]
-        except Exception as e:
-            return [{"error": f"Error generating flashcards: {str(e)}"}]
-    
-    def generate_mind_map(self, paper_content: str, title: str = "") -> Dict[str, Any]:
-        """Generate a mind map structure"""
-        system_prompt = """You are an expert knowledge visualizer. Create a mind map structure for this research paper that shows the relationships between key concepts.
+
+MIND_MAP_SYSTEM_PROMPT = """You are an expert knowledge visualizer. Create a mind map structure for this research paper that shows the relationships between key concepts.
         
         Format your response as a JSON object representing a hierarchical mind map:
         {
@@ -164,45 +85,477 @@ class LLMProcessor:
         }
         
         Create a logical hierarchy that helps visualize the paper's structure and key relationships."""
+
+def _extract_json(text: str) -> Any:
+    """Parse the first balanced JSON object or array in an LLM response
+    
+    Tolerates prose or code fences around the JSON. Raises ValueError when nothing parses.
+    """
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        pass
+    
+    start = _next_json_start(text, 0)
+    while start != -1:
+        depth = 0
+        in_string = False
+        escaped = False
+        for i in range(start, len(text)):
+            char = text[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in '{[':
+                depth += 1
+            elif char in '}]':
+                depth -= 1
+                if depth == 0:
+                    try:
+                        return orjson.loads(text[start:i + 1])
+                    except orjson.JSONDecodeError:
+                        break
+        start = _next_json_start(text, start + 1)
+    
+    raise ValueError("No JSON object or array found in response")
+
+def _next_json_start(text: str, position: int) -> int:
+    starts = [index for index in (text.find('{', position), text.find('[', position)) if index != -1]
+    return min(starts) if starts else -1
+
+class CachedLLM:
+    """Chat model wrapper that caches response content by prompt, model and temperature"""
+    
+    def __init__(self, llm, cache_directory: str = "./llm_cache", memory_size: int = 256):
+        self.llm = llm
+        self.disk_cache = diskcache.Cache(cache_directory)
+        self.memory_cache = OrderedDict()
+        self.memory_size = memory_size
+        # Requests and the ingest worker call one processor from several threads
+        self.memory_lock = threading.Lock()
+    
+    def _cache_key(self, messages: List[BaseMessage]) -> str:
+        hasher = hashlib.sha256()
+        for message in messages:
+            hasher.update(f"{message.type}\0{message.content}\0".encode())
+        hasher.update(f"{self.llm.model_name}\0{self.llm.temperature}".encode())
+        return hasher.hexdigest()
+    
+    def _remember(self, key: str, content: str):
+        with self.memory_lock:
+            self.memory_cache[key] = content
+            self.memory_cache.move_to_end(key)
+            if len(self.memory_cache) > self.memory_size:
+                self.memory_cache.popitem(last=False)
+    
+    def _lookup(self, key: str) -> Optional[str]:
+        with self.memory_lock:
+            content = self.memory_cache.get(key)
+            if content is not None:
+                self.memory_cache.move_to_end(key)
+                return content
+        
+        content = self.disk_cache.get(key)
+        if content is not None:
+            self._remember(key, content)
+        return content
+    
+    def _store(self, key: str, content: str):
+        self.disk_cache.set(key, content)
+        self._remember(key, content)
+    
+    def invoke(self, messages: List[BaseMessage]) -> AIMessage:
+        key = self._cache_key(messages)
+        content = self._lookup(key)
+        if content is None:
+            content = self.llm.invoke(messages).content
+            self._store(key, content)
+        return AIMessage(content=content)
+    
+    async def ainvoke(self, messages: List[BaseMessage]) -> AIMessage:
+        key = self._cache_key(messages)
+        content = self._lookup(key)
+        if content is None:
+            content = (await self.llm.ainvoke(messages)).content
+            self._store(key, content)
+        return AIMessage(content=content)
+    
+    def stream(self, messages: List[BaseMessage]) -> Iterator[AIMessageChunk]:
+        key = self._cache_key(messages)
+        content = self._lookup(key)
+        if content is not None:
+            yield AIMessageChunk(content=content)
+            return
+        
+        # Only a fully consumed stream is cached
+        parts = []
+        for chunk in self.llm.stream(messages):
+            parts.append(chunk.content)
+            yield chunk
+        self._store(key, "".join(parts))
+
+class LLMProcessor:
+    def __init__(self, cache_enabled: bool = True):
+        self.groq_api_key = os.getenv("GROQ_API_KEY")
+        if not self.groq_api_key:
+            raise ValueError("GROQ_API_KEY not found in environment variables")
+        
+        # One pooled HTTP/2 client per direction, reused by every call instead of a handshake per request
+        limits = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        self._http_client = httpx.Client(http2=True, limits=limits, timeout=60)
+        self._http_async_client = httpx.AsyncClient(http2=True, limits=limits, timeout=60)
+        
+        self.llm = ChatGroq(
+            groq_api_key=self.groq_api_key,
+            model_name="llama3-70b-8192",
+            temperature=0.1,
+            http_client=self._http_client,
+            http_async_client=self._http_async_client
+        )
+        
+        # Serve repeated prompts (retries, re-processing the same paper) from the response cache
+        if cache_enabled:
+            self.llm = CachedLLM(self.llm, os.getenv("LLM_CACHE_PATH", "./llm_cache"))
         
+        # cl100k_base tracks the Llama 3 tokenizer closely enough for prompt budgeting
+        self.encoding = tiktoken.get_encoding("cl100k_base")
+        # Study notes, flashcards and mind map share a budget, so one paper is truncated once, not per task
+        self._truncate = lru_cache(maxsize=32)(self._truncate_text)
+        
+        self._system_messages = {
+            "summary": SystemMessage(content=SUMMARY_SYSTEM_PROMPT),
+            "study_notes": SystemMessage(content=STUDY_NOTES_SYSTEM_PROMPT),
+            "mind_map": SystemMessage(content=MIND_MAP_SYSTEM_PROMPT),
+        }
+        # The flashcards prompt only varies with the card count
+        self._flashcards_system_message = lru_cache(maxsize=16)(self._build_flashcards_system_message)
+    
+    def _build_flashcards_system_message(self, num_cards: int) -> SystemMessage:
+        return SystemMessage(content=FLASHCARDS_SYSTEM_PROMPT.format(num_cards=num_cards))
+    
+    def _truncate_text(self, text: str, max_tokens: int) -> str:
+        """Cap text at max_tokens tokens"""
+        # Every token covers at least one character, so short text can skip encoding
+        if len(text) <= max_tokens:
+            return text
+        # Tokens average about four characters; only encode a generous prefix of long papers
+        prefix = text[:max_tokens * 10]
+        tokens = self.encoding.encode(prefix, disallowed_special=())
+        if len(tokens) <= max_tokens and len(prefix) == len(text):
+            return text
+        return self.encoding.decode(tokens[:max_tokens])
+    
+    def _summary_messages(self, paper_content: str, title: str = "") -> List[BaseMessage]:
+        user_prompt = f"""Please summarize this research paper:
+        
+        Title: {title}
+        
+        Content: {self._truncate(paper_content, CONTENT_TOKEN_BUDGETS['summary'])}...
+        
+        Provide a structured summary covering the key aspects mentioned in the instructions."""
+        
+        return [
+            self._system_messages["summary"],
+            HumanMessage(content=user_prompt)
+        ]
+    
+    def _study_notes_messages(self, paper_content: str, title: str = "") -> List[BaseMessage]:
+        user_prompt = f"""Create study notes for this research paper:
+        
+        Title: {title}
+        Content: {self._truncate(paper_content, CONTENT_TOKEN_BUDGETS['study_notes'])}...
+        
+        Focus on the most important concepts that a student should understand and remember."""
+        
+        return [
+            self._system_messages["study_notes"],
+            HumanMessage(content=user_prompt)
+        ]
+    
+    def _parse_study_notes(self, content: str) -> Dict[str, Any]:
+        # Try to parse JSON response
+        try:
+            notes = _extract_json(content)
+        except ValueError:
+            notes = None
+        if isinstance(notes, dict):
+            return notes
+        
+        # If JSON parsing fails or gives something other than an object, return structured text
+        return {
+            "key_concepts": [],
+            "main_points": [content],
+            "important_definitions": {},
+            "takeaways": [],
+            "study_questions": []
+        }
+    
+    def _flashcards_messages(self, paper_content: str, title: str = "", num_cards: int = 10) -> List[BaseMessage]:
+        user_prompt = f"""Create flashcards for this research paper:
+        
+        Title: {title}
+        Content: {self._truncate(paper_content, CONTENT_TOKEN_BUDGETS['flashcards'])}...
+        
+        Focus on key concepts, definitions, methods, and findings that students should memorize."""
+        
+        return [
+            self._flashcards_system_message(num_cards),
+            HumanMessage(content=user_prompt)
+        ]
+    
+    def _parse_flashcards(self, content: str) -> List[Dict[str, str]]:
+        # Try to parse JSON response
+        try:
+            return _extract_json(content)
+        except ValueError:
+            # If JSON parsing fails, create basic flashcards
+            return [
+                {
+                    "question": "What is the main contribution of this paper?",
+                    "answer": content[:200],
+                    "difficulty": "medium",
+                    "category": "concept"
+                }
+            ]
+    
+    def _mind_map_messages(self, paper_content: str, title: str = "") -> List[BaseMessage]:
         user_prompt = f"""Create a mind map for this research paper:
         
         Title: {title}
-        Content: {paper_content[:3000]}...
+        Content: {self._truncate(paper_content, CONTENT_TOKEN_BUDGETS['mind_map'])}...
         
         Show the main concepts and their relationships in a hierarchical structure."""
         
+        return [
+            self._system_messages["mind_map"],
+            HumanMessage(content=user_prompt)
+        ]
+    
+    def _parse_mind_map(self, content: str, title: str = "") -> Dict[str, Any]:
+        # Try to parse JSON response
         try:
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ]
+            return _extract_json(content)
+        except ValueError:
+            # If JSON parsing fails, create basic structure
+            return {
+                "title": title,
+                "central_concept": "Research Paper",
+                "branches": [
+                    {
+                        "name": "Main Content",
+                        "children": [
+                            {"name": "Key Findings", "children": []},
+                            {"name": "Methodology", "children": []},
+                            {"name": "Conclusions", "children": []}
+                        ]
+                    }
+                ]
+            }
+    
+    def generate_summary(self, paper_content: str, title: str = "") -> str:
+        try:
+            response = self.llm.invoke(self._summary_messages(paper_content, title))
+            return response.content
+        except Exception as e:
+            return f"Error generating summary: {str(e)}"
+    
+    def generate_study_notes(self, paper_content: str, title: str = "") -> Dict[str, Any]:
+        """Generate structured study notes"""
+        try:
+            response = self.llm.invoke(self._study_notes_messages(paper_content, title))
+            return self._parse_study_notes(response.content)
+        except Exception as e:
+            return {"error": f"Error generating study notes: {str(e)}"}
+    
+    def generate_flashcards(self, paper_content: str, title: str = "", num_cards: int = 10) -> List[Dict[str, str]]:
+        """Generate flashcards for active recall"""
+        try:
+            response = self.llm.invoke(self._flashcards_messages(paper_content, title, num_cards))
+            return self._parse_flashcards(response.content)
+        except Exception as e:
+            return [{"error": f"Error generating flashcards: {str(e)}"}]
+    
+    def batch_generate_flashcards(self, papers: List[Dict], num_cards: int = 10, batch_size: int = 4) -> List[List[Dict[str, str]]]:
+        """Generate flashcards for several papers per LLM call
+        
+        Each paper dict carries "title" and "content". Results are returned in input order;
+        papers missing from a batched response fall back to their own generate_flashcards call.
+        """
+        results = []
+        for offset in range(0, len(papers), batch_size):
+            batch = papers[offset:offset + batch_size]
+            tags = [f"P{i}" for i in range(1, len(batch) + 1)]
             
-            response = self.llm.invoke(messages)
-            # Try to parse JSON response
+            system_prompt = f"""You are an expert educator. For each research paper below, create {num_cards} flashcards for active recall and spaced repetition.
+            
+            Papers are tagged [P1], [P2], ... Format your response as a single JSON object keyed by tag, each value a JSON array of flashcards:
+            {{
+                "P1": [{{"question": "Q1", "answer": "A1", "difficulty": "easy|medium|hard", "category": "concept|definition|application"}}, ...],
+                "P2": [...]
+            }}
+            
+            Make questions clear and answers concise but complete. Include a mix of difficulties and categories."""
+            
+            papers_info = "\n\n".join([
+                f"[{tag}] Title: {paper.get('title', 'Unknown')}\nContent: {self._truncate(paper.get('content') or '', CONTENT_TOKEN_BUDGETS['flashcards_batch_per_paper'])}..."
+                for tag, paper in zip(tags, batch)
+            ])
+            
+            user_prompt = f"""Create flashcards for each of these research papers:
+            
+            {papers_info}
+            
+            Focus on key concepts, definitions, methods, and findings that students should memorize."""
+            
+            by_tag = {}
             try:
-                return json.loads(response.content)
-            except json.JSONDecodeError:
-                # If JSON parsing fails, create basic structure
-                return {
-                    "title": title,
-                    "central_concept": "Research Paper",
-                    "branches": [
-                        {
-                            "name": "Main Content",
-                            "children": [
-                                {"name": "Key Findings", "children": []},
-                                {"name": "Methodology", "children": []},
-                                {"name": "Conclusions", "children": []}
-                            ]
-                        }
-                    ]
-                }
+                messages = [
+                    SystemMessage(content=system_prompt),
+                    HumanMessage(content=user_prompt)
+                ]
+                
+                response = self.llm.invoke(messages)
+                parsed = _extract_json(response.content)
+                if isinstance(parsed, dict):
+                    by_tag = parsed
+            except Exception:
+                by_tag = {}
+            
+            for tag, paper in zip(tags, batch):
+                cards = by_tag.get(tag)
+                if isinstance(cards, list) and cards:
+                    results.append(cards)
+                else:
+                    results.append(self.generate_flashcards(paper.get('content') or '', paper.get('title', ''), num_cards))
+        
+        return results
+    
+    def generate_mind_map(self, paper_content: str, title: str = "") -> Dict[str, Any]:
+        """Generate a mind map structure"""
+        try:
+            response = self.llm.invoke(self._mind_map_messages(paper_content, title))
+            return self._parse_mind_map(response.content, title)
         except Exception as e:
             return {"error": f"Error generating mind map: {str(e)}"}
     
-    def answer_question(self, question: str, context: str, chat_history: List[Dict] = None) -> str:
-        """Answer a question based on the provided context"""
+    def generate_summary_stream(self, paper_content: str, title: str = "") -> Iterator[str]:
+        """Stream the summary text as it is generated"""
+        try:
+            for chunk in self.llm.stream(self._summary_messages(paper_content, title)):
+                yield chunk.content
+        except Exception as e:
+            yield f"Error generating summary: {str(e)}"
+    
+    def generate_flashcards_stream(self, paper_content: str, title: str = "", num_cards: int = 10) -> Iterator[Dict[str, str]]:
+        """Yield flashcards one by one as soon as each JSON object in the response is complete"""
+        try:
+            cards = ijson.sendable_list()
+            parser = ijson.items_coro(cards, "item")
+            parts = []
+            emitted = 0
+            
+            for chunk in self.llm.stream(self._flashcards_messages(paper_content, title, num_cards)):
+                parts.append(chunk.content)
+                if parser is None:
+                    continue
+                try:
+                    parser.send(chunk.content.encode())
+                except ijson.JSONError:
+                    # Not a bare JSON array (e.g. prose around it); parse the full response at the end
+                    parser = None
+                    continue
+                emitted += len(cards)
+                yield from cards
+                del cards[:]
+            
+            if emitted == 0:
+                yield from self._parse_flashcards("".join(parts))
+        except Exception as e:
+            yield {"error": f"Error generating flashcards: {str(e)}"}
+    
+    def _generation_specs(self, paper_content: str, title: str, num_cards: int) -> Dict[str, Tuple]:
+        """Message builder, response parser and error result for each per-paper generation task"""
+        return {
+            "summary": (
+                lambda: self._summary_messages(paper_content, title),
+                lambda content: content,
+                lambda e: f"Error generating summary: {str(e)}"
+            ),
+            "study_notes": (
+                lambda: self._study_notes_messages(paper_content, title),
+                self._parse_study_notes,
+                lambda e: {"error": f"Error generating study notes: {str(e)}"}
+            ),
+            "flashcards": (
+                lambda: self._flashcards_messages(paper_content, title, num_cards),
+                self._parse_flashcards,
+                lambda e: [{"error": f"Error generating flashcards: {str(e)}"}]
+            ),
+            "mind_map": (
+                lambda: self._mind_map_messages(paper_content, title),
+                lambda content: self._parse_mind_map(content, title),
+                lambda e: {"error": f"Error generating mind map: {str(e)}"}
+            ),
+        }
+    
+    def _collect_results(self, specs: Dict[str, Tuple], tasks: Tuple[str, ...], responses: List[Any]) -> Dict[str, Any]:
+        results = {}
+        for task, response in zip(tasks, responses):
+            _, parse, on_error = specs[task]
+            if isinstance(response, Exception):
+                results[task] = on_error(response)
+            else:
+                results[task] = parse(response.content)
+        return results
+    
+    async def agenerate_all(
+        self,
+        paper_content: str,
+        title: str = "",
+        num_cards: int = 10,
+        tasks: Tuple[str, ...] = GENERATION_TASKS
+    ) -> Dict[str, Any]:
+        """Run the per-paper generation calls concurrently and return the results keyed by task name
+        
+        The shared async HTTP client keeps connections tied to the event loop that opened them,
+        so call this from one long-lived loop (the background worker's).
+        """
+        specs = self._generation_specs(paper_content, title, num_cards)
+        
+        # Every call is network-bound, so issue them together and wait for the slowest one
+        responses = await asyncio.gather(
+            *[self.llm.ainvoke(specs[task][0]()) for task in tasks],
+            return_exceptions=True
+        )
+        return self._collect_results(specs, tasks, responses)
+    
+    def generate_all(
+        self,
+        paper_content: str,
+        title: str = "",
+        num_cards: int = 10,
+        tasks: Tuple[str, ...] = GENERATION_TASKS
+    ) -> Dict[str, Any]:
+        """Synchronous counterpart of agenerate_all, overlapping the calls on threads"""
+        specs = self._generation_specs(paper_content, title, num_cards)
+        
+        def run(task: str):
+            try:
+                return self.llm.invoke(specs[task][0]())
+            except Exception as e:
+                return e
+        
+        with ThreadPoolExecutor(max_workers=len(tasks) or 1) as executor:
+            responses = list(executor.map(run, tasks))
+        return self._collect_results(specs, tasks, responses)
+    
+    def _answer_messages(self, question: str, context: str, chat_history: List[Dict] = None) -> List[BaseMessage]:
         system_prompt = """You are an expert research assistant. Answer the user's question based on the provided context from research papers. 
         
         Guidelines:
@@ -227,17 +580,27 @@ class LLMProcessor:
         
         Please provide a comprehensive answer based on the context provided."""
         
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_prompt)
+        ]
+    
+    def answer_question(self, question: str, context: str, chat_history: List[Dict] = None) -> str:
+        """Answer a question based on the provided context"""
         try:
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ]
-            
-            response = self.llm.invoke(messages)
+            response = self.llm.invoke(self._answer_messages(question, context, chat_history))
             return response.content
         except Exception as e:
             return f"Error answering question: {str(e)}"
     
+    def answer_question_stream(self, question: str, context: str, chat_history: List[Dict] = None) -> Iterator[str]:
+        """Stream the answer to a question as it is generated"""
+        try:
+            for chunk in self.llm.stream(self._answer_messages(question, context, chat_history)):
+                yield chunk.content
+        except Exception as e:
+            yield f"Error answering question: {str(e)}"
+    
     def generate_study_plan(self, user_goal: str, papers: List[Dict], deadline: str = None) -> Dict[str, Any]:
         """Generate a personalized study plan"""
         system_prompt = """You are an expert study planner. Create a detailed study plan based on the user's goal and available papers.
@@ -262,7 +625,7 @@ class LLMProcessor:
             "study_tips": ["tip1", "tip2", ...]
         }"""
         
-        papers_info = "\n".join([f"- {paper.get('title', 'Unknown')}: {paper.get('abstract', 'No abstract')[:200]}..." for paper in papers])
+        papers_info = "\n".join([f"- {paper.get('title', 'Unknown')}: {self._truncate(paper.get('abstract') or 'No abstract', CONTENT_TOKEN_BUDGETS['study_plan_per_paper'])}..." for paper in papers])
         
         user_prompt = f"""Create a study plan for this goal: {user_goal}
         
@@ -282,8 +645,8 @@ class LLMProcessor:
             response = self.llm.invoke(messages)
             # Try to parse JSON response
             try:
-                return json.loads(response.content)
-            except json.JSONDecodeError:
+                return _extract_json(response.content)
+            except ValueError:
                 # If JSON parsing fails, create basic plan
                 return {
                     "plan_title": f"Study Plan: {user_goal}",
@@ -323,7 +686,7 @@ class LLMProcessor:
         ]"""
         
         papers_info = "\n".join([
-            f"Paper: {paper.get('title', 'Unknown')}\nAbstract: {paper.get('abstract', 'No abstract')[:300]}...\n"
+            f"Paper: {paper.get('title', 'Unknown')}\nAbstract: {self._truncate(paper.get('abstract') or 'No abstract', CONTENT_TOKEN_BUDGETS['insights_per_paper'])}...\n"
             for paper in papers
         ])
         
@@ -342,8 +705,8 @@ class LLMProcessor:
             response = self.llm.invoke(messages)
             # Try to parse JSON response
             try:
-                return json.loads(response.content)
-            except json.JSONDecodeError:
+                return _extract_json(response.content)
+            except ValueError:
                 # If JSON parsing fails, create basic insight
                 return [
                     {
@@ -0,0 +1,76 @@
+import copy
+import os
+import numpy as np
+import onnxruntime as ort
+from onnxruntime.quantization import QuantType, quantize_dynamic
+import torch
+from sentence_transformers import SentenceTransformer
+from typing import List
+
+class OnnxQueryEncoder:
+    """Runs a SentenceTransformer's transformer through ONNX Runtime for low-latency query embedding
+
+    Reproduces the all-MiniLM-L6-v2 pipeline (transformer, mean pooling, L2 normalization)
+    and exports the ONNX graph from the loaded model on first use. With quantize=True the
+    graph's weights are dynamically quantized to int8, which runs on the CPU's int8 GEMM
+    kernels (VNNI where available) at a small cost in embedding accuracy.
+    """
+
+    def __init__(self, model: SentenceTransformer, model_path: str = "./onnx_model/model.onnx", quantize: bool = False):
+        self.tokenizer = model.tokenizer
+        self.max_seq_length = model.max_seq_length
+
+        if not os.path.exists(model_path):
+            self._export(model, model_path)
+
+        if quantize:
+            quantized_path = model_path.replace(".onnx", ".int8.onnx")
+            if not os.path.exists(quantized_path):
+                quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+            model_path = quantized_path
+        self.model_path = model_path
+
+        # Single queries are latency-bound, so one intra-op thread avoids pool spin-up per run
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    def _export(self, model: SentenceTransformer, model_path: str):
+        os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+        # Export from a copy: the model is the process-wide singleton, possibly fp16 on the GPU for ingestion
+        transformer = copy.deepcopy(model[0].auto_model).cpu().float().eval()
+        dummy = self.tokenizer(["export"], return_tensors="pt")
+        input_names = ["input_ids", "attention_mask", "token_type_ids"]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(dummy[name] for name in input_names),
+                model_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts, returning L2-normalized float32 vectors"""
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np"
+        )
+        inputs = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        token_embeddings = self.session.run(["last_hidden_state"], inputs)[0]
+
+        # Mean pooling over non-padding tokens, then normalize
+        mask = encoded["attention_mask"][..., np.newaxis].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / np.clip(norms, 1e-12, None)).astype(np.float32, copy=False)
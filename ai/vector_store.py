@@ -1,17 +1,81 @@
 import os
 os.environ['ANONYMIZED_TELEMETRY'] = 'false'
 os.environ['CHROMA_TELEMETRY'] = 'false'
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
 
 import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache, lru_cache
+import numpy as np
+import torch
+import diskcache
+import hashlib
 import json
+import queue
+import re
+import string
+import threading
+import time
 from datetime import datetime
 import logging
 
 logging.getLogger('chromadb.telemetry').setLevel(logging.CRITICAL)
 
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Chunks per forward pass when embedding a paper; larger batches amortize per-call overhead
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+
+# Disk cache key counting writes to the collection. It lives in the shared query cache so every
+# VectorStore using that cache, in any process, sees another's adds and deletes
+CORPUS_VERSION_KEY = "corpus_version"
+
+# Seconds a cached RAG answer is served before the question goes through the pipeline again
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+
+def quantize_int8(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization, returning the codes and one float32 scale per vector"""
+    embeddings = np.atleast_2d(embeddings)
+    scales = np.abs(embeddings).max(axis=1, keepdims=True) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(embeddings / scales).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def dequantize_int8(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """Inverse of quantize_int8"""
+    return codes.astype(np.float32) * scales
+
+def _dedupe(chunks: List[str]) -> Tuple[List[str], Optional[np.ndarray]]:
+    """Distinct chunks in first-seen order, plus the index mapping each chunk to its
+    distinct entry (None when nothing repeats)"""
+    positions = {}
+    unique_chunks = []
+    for chunk in chunks:
+        if chunk not in positions:
+            positions[chunk] = len(unique_chunks)
+            unique_chunks.append(chunk)
+    
+    if len(unique_chunks) == len(chunks):
+        return chunks, None
+    return unique_chunks, np.fromiter((positions[chunk] for chunk in chunks), dtype=np.intp, count=len(chunks))
+
+@cache
+def get_embedding_model() -> SentenceTransformer:
+    """Load the embedding model once per process, in half precision when a GPU is available"""
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model_kwargs = {"torch_dtype": torch.float16} if device == "cuda" else {}
+    return SentenceTransformer(EMBEDDING_MODEL_NAME, device=device, model_kwargs=model_kwargs)
+
+@cache
+def get_onnx_query_encoder(model_path: str, quantize: bool = False):
+    """Build the ONNX Runtime query encoder once per process"""
+    from ai.onnx_encoder import OnnxQueryEncoder
+    return OnnxQueryEncoder(get_embedding_model(), model_path, quantize=quantize)
+
 class VectorStore:
     def __init__(self, persist_directory: str = "./vector_store"):
         self.persist_directory = persist_directory
@@ -25,41 +89,48 @@ class VectorStore:
         except Exception as e:
             self.client = chromadb.PersistentClient(path=persist_directory)
         
-        # Initialize embedding model
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Initialize embedding model (shared by every VectorStore in the process)
+        self.embedding_model = get_embedding_model()
+        self.device = str(self.embedding_model.device)
+        
+        # Optional ONNX Runtime path for query-time embedding (EMBEDDING_BACKEND=onnx), with
+        # int8 weights when ONNX_QUANTIZE=int8
+        self.query_encoder = None
+        self.query_variant = "fp32"
+        if os.getenv("EMBEDDING_BACKEND", "torch") == "onnx":
+            quantize = os.getenv("ONNX_QUANTIZE", "") == "int8"
+            self.query_encoder = get_onnx_query_encoder(os.getenv("ONNX_MODEL_PATH", "./onnx_model/model.onnx"), quantize)
+            if quantize:
+                self.query_variant = "int8-model"
+        
+        # Repeated queries skip the forward pass: per-instance LRU in front of an on-disk tier
+        self.query_cache = diskcache.Cache(os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache"))
+        self._embed_query = lru_cache(maxsize=4096)(self._encode_query)
         
         # Create or get collection
         self.collection = self.client.get_or_create_collection(
             name="research_papers",
             metadata={"description": "Research paper embeddings"}
         )
+        
+        # Largest write Chroma accepts in one call (bounded by SQLite's variable limit)
+        self.max_batch_size = self.client.get_max_batch_size()
     
-    def add_paper(self, paper_id: int, title: str, content: str, chunks: List[str], metadata: Dict[str, Any] = None):
-        """Add a paper's chunks to the vector store"""
+    def add_paper(self, paper_id: int, title: str, content: str, chunks: List[str], metadata: Dict[str, Any] = None, embeddings: Optional[np.ndarray] = None):
+        """Add a paper's chunks to the vector store, embedding them unless embeddings are passed in"""
         try:
             # Generate embeddings for all chunks
-            embeddings = self.embedding_model.encode(chunks).tolist()
+            if embeddings is None:
+                embeddings = self.embed_many(chunks)
             
             # Create unique IDs for each chunk
-            chunk_ids = [f"paper_{paper_id}_chunk_{i}" for i in range(len(chunks))]
+            chunk_ids = self._chunk_ids(paper_id, chunks)
             
             # Prepare metadata for each chunk
-            chunk_metadata = []
-            for i, chunk in enumerate(chunks):
-                chunk_meta = {
-                    "paper_id": paper_id,
-                    "title": title,
-                    "chunk_index": i,
-                    "total_chunks": len(chunks),
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "content_length": len(chunk)
-                }
-                if metadata:
-                    chunk_meta.update(metadata)
-                chunk_metadata.append(chunk_meta)
+            chunk_metadata = self._chunk_metadata(paper_id, title, chunks, metadata)
             
-            # Add to collection
-            self.collection.add(
+            # Upsert so a retried paper overwrites its chunk ids instead of failing on duplicates
+            self._upsert(
                 embeddings=embeddings,
                 documents=chunks,
                 metadatas=chunk_metadata,
@@ -71,16 +142,191 @@ class VectorStore:
             print(f"Error adding paper to vector store: {str(e)}")
             return False
     
+    def add_paper_streaming(self, paper_id: int, title: str, text: str, metadata: Dict[str, Any] = None, batch_size: int = 32):
+        """Preprocess, chunk and embed a paper as a pipeline
+        
+        A worker thread preprocesses and chunks the text into a bounded queue while this thread
+        encodes mini-batches as they fill, so chunking overlaps with embedding.
+        """
+        chunk_queue = queue.Queue(maxsize=batch_size * 4)
+        stop = threading.Event()
+        done = object()
+        
+        def produce():
+            try:
+                for chunk in iter_chunks(preprocess_text(text)):
+                    while not stop.is_set():
+                        try:
+                            chunk_queue.put(chunk, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                    if stop.is_set():
+                        return
+            finally:
+                chunk_queue.put(done)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                producer = executor.submit(produce)
+                try:
+                    chunks, embeddings, batch = [], [], []
+                    while True:
+                        item = chunk_queue.get()
+                        if item is not done:
+                            batch.append(item)
+                        if batch and (item is done or len(batch) == batch_size):
+                            embeddings.append(self.embed_many(batch, batch_size))
+                            chunks.extend(batch)
+                            batch = []
+                        if item is done:
+                            break
+                finally:
+                    # Unblock the producer if encoding failed part way through
+                    stop.set()
+                producer.result()
+            
+            if not chunks:
+                return True
+            
+            self._upsert(
+                embeddings=np.concatenate(embeddings),
+                documents=chunks,
+                metadatas=self._chunk_metadata(paper_id, title, chunks, metadata),
+                ids=self._chunk_ids(paper_id, chunks)
+            )
+            
+            return True
+        except Exception as e:
+            print(f"Error adding paper to vector store: {str(e)}")
+            return False
+    
+    def add_papers(self, papers: List[Dict[str, Any]]):
+        """Add many papers' chunks with one batched encode and as few collection writes as possible
+        
+        Each entry takes the same fields as add_paper: paper_id, title, chunks and optional metadata.
+        """
+        try:
+            all_chunks, all_ids, all_metadata = [], [], []
+            for paper in papers:
+                chunks = paper["chunks"]
+                all_chunks.extend(chunks)
+                all_ids.extend(self._chunk_ids(paper["paper_id"], chunks))
+                all_metadata.extend(
+                    self._chunk_metadata(paper["paper_id"], paper["title"], chunks, paper.get("metadata"))
+                )
+            
+            if not all_chunks:
+                return True
+            
+            self._upsert(
+                embeddings=self.embed_many(all_chunks),
+                documents=all_chunks,
+                metadatas=all_metadata,
+                ids=all_ids
+            )
+            
+            return True
+        except Exception as e:
+            print(f"Error adding papers to vector store: {str(e)}")
+            return False
+    
+    def embed_many(self, chunks: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """Embed all chunks in one encode call, returning normalized float32 vectors"""
+        batch_size = batch_size or EMBEDDING_BATCH_SIZE
+        unique_chunks, inverse = _dedupe(chunks)
+        # Chroma expects float32, which the fp16 CUDA model does not produce on its own
+        embeddings = self.embedding_model.encode(
+            unique_chunks,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+        return embeddings if inverse is None else embeddings[inverse]
+    
+    def _upsert(self, embeddings, documents: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        """Write chunks in as few calls as Chroma's batch limit allows, so long papers and
+        multi-paper ingests don't exceed it"""
+        try:
+            for start in range(0, len(ids), self.max_batch_size):
+                end = start + self.max_batch_size
+                self.collection.upsert(
+                    embeddings=embeddings[start:end],
+                    documents=documents[start:end],
+                    metadatas=metadatas[start:end],
+                    ids=ids[start:end]
+                )
+        finally:
+            self._bump_corpus_version()
+    
+    def corpus_version(self) -> int:
+        """Counter that changes whenever chunks are added or deleted"""
+        return self.query_cache.get(CORPUS_VERSION_KEY, 0)
+    
+    def _bump_corpus_version(self):
+        self.query_cache.incr(CORPUS_VERSION_KEY, default=0)
+    
+    def _chunk_ids(self, paper_id: int, chunks: List[str]) -> List[str]:
+        return [f"paper_{paper_id}_chunk_{i}" for i in range(len(chunks))]
+    
+    def _chunk_metadata(self, paper_id: int, title: str, chunks: List[str], metadata: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        # One timestamp for the whole paper rather than one clock read per chunk
+        timestamp = datetime.utcnow().isoformat()
+        total_chunks = len(chunks)
+        extra = metadata or {}
+        return [
+            {
+                "paper_id": paper_id,
+                "title": title,
+                "chunk_index": i,
+                "total_chunks": total_chunks,
+                "timestamp": timestamp,
+                "content_length": len(chunk),
+                **extra
+            }
+            for i, chunk in enumerate(chunks)
+        ]
+    
+    def _encode_query(self, query: str) -> np.ndarray:
+        """Embed a single query, consulting the on-disk cache before the model"""
+        # The disk tier keeps the exact float32 vector, so a query ranks chunks the same way
+        # whether or not it was cached (the int8 form is only used for bulk chunk embeddings)
+        # The int8 model's vectors differ slightly from the fp32 ones, so it keeps its own entries
+        key_prefix = EMBEDDING_MODEL_NAME if self.query_variant == "fp32" else f"{EMBEDDING_MODEL_NAME}\0{self.query_variant}"
+        key = hashlib.sha256(f"{key_prefix}\0{query}".encode()).hexdigest()
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            if self.query_encoder is not None:
+                embedding = self.query_encoder.encode([query])[0]
+            else:
+                embedding = self.embedding_model.encode(
+                    [query],
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                ).astype(np.float32, copy=False)[0]
+            self.query_cache.set(key, embedding)
+        
+        # Shared between callers through the LRU, so keep it immutable
+        embedding.flags.writeable = False
+        return embedding
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Normalized, read-only float32 embedding of a query, cached across repeated queries"""
+        return self._embed_query(query)
+    
     def search_similar(self, query: str, n_results: int = 5, paper_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """Search for similar content using vector similarity"""
         try:
-            # Generate embedding for query
-            query_embedding = self.embedding_model.encode([query]).tolist()
+            # Generate embedding for query (cached across repeated queries); Chroma takes the
+            # float32 ndarray as-is, so hand it a (1, dim) view rather than a list copy
+            query_embedding = self._embed_query(query).reshape(1, -1)
             
             # Prepare where clause for filtering
             where_clause = None
             if paper_id:
-                where_clause = {"paper_id": paper_id}
+                where_clause = {"paper_id": {"$eq": paper_id}}
             
             # Search in collection
             results = self.collection.query(
@@ -90,17 +336,17 @@ class VectorStore:
             )
             
             # Format results
-            formatted_results = []
-            for i in range(len(results['documents'][0])):
-                result = {
-                    "content": results['documents'][0][i],
-                    "metadata": results['metadatas'][0][i],
-                    "distance": results['distances'][0][i] if 'distances' in results else 0.0,
-                    "id": results['ids'][0][i]
-                }
-                formatted_results.append(result)
+            documents = results['documents'][0]
+            metadatas = results['metadatas'][0]
+            ids = results['ids'][0]
+            distances = np.zeros(len(documents), dtype=np.float32)
+            if results.get('distances'):
+                distances = np.asarray(results['distances'][0], dtype=np.float32)
             
-            return formatted_results
+            return [
+                {"content": document, "metadata": meta, "distance": distance, "id": chunk_id}
+                for document, meta, distance, chunk_id in zip(documents, metadatas, distances.tolist(), ids)
+            ]
         except Exception as e:
             print(f"Error searching vector store: {str(e)}")
             return []
@@ -112,18 +358,16 @@ class VectorStore:
     def get_paper_chunks(self, paper_id: int) -> List[Dict[str, Any]]:
         """Get all chunks for a specific paper"""
         try:
+            # Embeddings are never used here, so don't transfer them
             results = self.collection.get(
-                where={"paper_id": paper_id}
+                where={"paper_id": {"$eq": paper_id}},
+                include=["documents", "metadatas"]
             )
             
-            formatted_results = []
-            for i in range(len(results['documents'])):
-                result = {
-                    "content": results['documents'][i],
-                    "metadata": results['metadatas'][i],
-                    "id": results['ids'][i]
-                }
-                formatted_results.append(result)
+            formatted_results = [
+                {"content": document, "metadata": meta, "id": chunk_id}
+                for document, meta, chunk_id in zip(results['documents'], results['metadatas'], results['ids'])
+            ]
             
             # Sort by chunk index
             formatted_results.sort(key=lambda x: x['metadata'].get('chunk_index', 0))
@@ -132,22 +376,62 @@ class VectorStore:
             print(f"Error getting paper chunks: {str(e)}")
             return []
     
+    def copy_paper(self, source_paper_id: int, paper_id: int, title: str, metadata: Dict[str, Any] = None) -> bool:
+        """Duplicate a paper's chunks under a new paper id, reusing the stored embeddings"""
+        try:
+            results = self.collection.get(
+                where={"paper_id": {"$eq": source_paper_id}},
+                include=["embeddings", "documents", "metadatas"]
+            )
+            if not results['ids']:
+                return False
+            
+            timestamp = datetime.utcnow().isoformat()
+            extra = metadata or {}
+            chunk_metadata = [
+                {**meta, "paper_id": paper_id, "title": title, "timestamp": timestamp, **extra}
+                for meta in results['metadatas']
+            ]
+            
+            self._upsert(
+                embeddings=results['embeddings'],
+                documents=results['documents'],
+                metadatas=chunk_metadata,
+                ids=[f"paper_{paper_id}_chunk_{meta['chunk_index']}" for meta in results['metadatas']]
+            )
+            
+            return True
+        except Exception as e:
+            print(f"Error copying paper in vector store: {str(e)}")
+            return False
+    
     def delete_paper(self, paper_id: int):
         """Delete all chunks for a specific paper"""
         try:
-            # Get all chunk IDs for this paper
+            # Get all chunk IDs for this paper (ids are always returned)
             results = self.collection.get(
-                where={"paper_id": paper_id}
+                where={"paper_id": {"$eq": paper_id}},
+                include=[]
             )
             
             if results['ids']:
                 self.collection.delete(ids=results['ids'])
+                self._bump_corpus_version()
             
             return True
         except Exception as e:
             print(f"Error deleting paper from vector store: {str(e)}")
             return False
     
+    def warmup(self):
+        """Run one embedding through each query path and load the search index, so the first
+        real request doesn't pay for lazy initialization"""
+        embedding = self.embed_many(["warmup"])[0]
+        if self.query_encoder is not None:
+            self.query_encoder.encode(["warmup"])
+        if self.collection.count():
+            self.collection.query(query_embeddings=[embedding.tolist()], n_results=1, include=[])
+    
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get statistics about the vector store"""
         try:
@@ -155,14 +439,59 @@ class VectorStore:
             return {
                 "total_chunks": count,
                 "collection_name": self.collection.name,
-                "embedding_model": "all-MiniLM-L6-v2"
+                "embedding_model": EMBEDDING_MODEL_NAME
             }
         except Exception as e:
             return {"error": str(e)}
 
+class SemanticCache:
+    """Fixed-size FIFO of (query embedding, payload) pairs looked up by cosine similarity
+    
+    Entries older than ttl seconds are never returned.
+    """
+    
+    def __init__(self, capacity: int = 2048, threshold: float = 0.97, ttl: float = SEMANTIC_CACHE_TTL):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.embeddings = None
+        self.stored_at = np.zeros(capacity, dtype=np.float64)
+        self.payloads = [None] * capacity
+        self.size = 0
+        self.next_slot = 0
+        self.lock = threading.Lock()
+    
+    def get(self, embedding: np.ndarray) -> Optional[Any]:
+        """Payload of the most similar stored query, if it clears the threshold"""
+        with self.lock:
+            if self.size == 0:
+                return None
+            # Embeddings are normalized, so the dot product is the cosine similarity
+            scores = self.embeddings[:self.size] @ embedding
+            scores[time.monotonic() - self.stored_at[:self.size] > self.ttl] = -np.inf
+            best = int(np.argmax(scores))
+            return self.payloads[best] if scores[best] > self.threshold else None
+    
+    def put(self, embedding: np.ndarray, payload: Any):
+        with self.lock:
+            if self.embeddings is None:
+                self.embeddings = np.zeros((self.capacity, embedding.shape[0]), dtype=np.float32)
+            # Overwrite the oldest slot once full
+            self.embeddings[self.next_slot] = embedding
+            self.stored_at[self.next_slot] = time.monotonic()
+            self.payloads[self.next_slot] = payload
+            self.next_slot = (self.next_slot + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+
 class RAGProcessor:
-    def __init__(self, vector_store: VectorStore):
+    def __init__(self, vector_store: VectorStore, semantic_cache_size: int = 2048, semantic_cache_threshold: float = 0.97):
         self.vector_store = vector_store
+        self.semantic_cache_size = semantic_cache_size
+        self.semantic_cache_threshold = semantic_cache_threshold
+        # One cache per user and search scope (a paper id, or None for the whole library),
+        # all dropped once the collection changes
+        self.semantic_caches: Dict[Tuple[Optional[int], Optional[int]], SemanticCache] = {}
+        self.semantic_cache_version = None
     
     def retrieve_context(self, query: str, paper_id: Optional[int] = None, max_chunks: int = 5) -> List[Dict[str, Any]]:
         """Retrieve relevant context for a query"""
@@ -206,8 +535,31 @@ class RAGProcessor:
         
         return sources
     
-    def answer_with_context(self, query: str, llm_processor, paper_id: Optional[int] = None, chat_history: List[Dict] = None) -> Dict[str, Any]:
+    def _semantic_cache_lookup(self, query: str, paper_id: Optional[int], chat_history: List[Dict], user_id: Optional[int]):
+        """Cache, query embedding and cached result for a question, or Nones for follow-ups"""
+        # Near-duplicate standalone questions reuse an earlier answer; follow-ups depend on
+        # the conversation so they always go through the full pipeline
+        if chat_history:
+            return None, None, None
+        
+        # Answers cached before a paper was added or deleted may cite stale content
+        version = self.vector_store.corpus_version()
+        if version != self.semantic_cache_version:
+            self.semantic_caches = {}
+            self.semantic_cache_version = version
+        
+        query_embedding = self.vector_store.embed_query(query)
+        semantic_cache = self.semantic_caches.setdefault(
+            (user_id, paper_id), SemanticCache(self.semantic_cache_size, self.semantic_cache_threshold)
+        )
+        return semantic_cache, query_embedding, semantic_cache.get(query_embedding)
+    
+    def answer_with_context(self, query: str, llm_processor, paper_id: Optional[int] = None, chat_history: List[Dict] = None, user_id: Optional[int] = None) -> Dict[str, Any]:
         """Complete RAG pipeline: retrieve context and generate answer"""
+        semantic_cache, query_embedding, cached = self._semantic_cache_lookup(query, paper_id, chat_history, user_id)
+        if cached is not None:
+            return cached
+        
         # Retrieve relevant context
         context_chunks = self.retrieve_context(query, paper_id)
         
@@ -220,46 +572,104 @@ class RAGProcessor:
         # Get sources
         sources = self.get_sources(context_chunks)
         
-        return {
+        result = {
             "answer": answer,
             "context": [chunk['content'] for chunk in context_chunks],
             "sources": sources,
             "num_sources": len(context_chunks)
         }
+        
+        if semantic_cache is not None and context_chunks and not answer.startswith("Error answering question"):
+            semantic_cache.put(query_embedding, result)
+        
+        return result
+    
+    def stream_answer_with_context(self, query: str, llm_processor, paper_id: Optional[int] = None, chat_history: List[Dict] = None, user_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Streaming RAG pipeline: yields {"token": ...} events, then a final result like answer_with_context's"""
+        semantic_cache, query_embedding, cached = self._semantic_cache_lookup(query, paper_id, chat_history, user_id)
+        if cached is not None:
+            yield {"token": cached["answer"]}
+            yield cached
+            return
+        
+        context_chunks = self.retrieve_context(query, paper_id)
+        formatted_context = self.format_context_for_llm(context_chunks)
+        
+        parts = []
+        for token in llm_processor.answer_question_stream(query, formatted_context, chat_history):
+            parts.append(token)
+            yield {"token": token}
+        answer = "".join(parts)
+        
+        result = {
+            "answer": answer,
+            "context": [chunk['content'] for chunk in context_chunks],
+            "sources": self.get_sources(context_chunks),
+            "num_sources": len(context_chunks)
+        }
+        
+        if semantic_cache is not None and context_chunks and "Error answering question" not in answer:
+            semantic_cache.put(query_embedding, result)
+        
+        yield result
 
 # Utility functions for text processing
+_SENTENCE_END_RE = re.compile(r'[.!?](?:\s|$)')
+_SPACE_RE = re.compile(' ')
+
 def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
     """Split text into overlapping chunks"""
     if len(text) <= chunk_size:
         return [text]
     
-    chunks = []
+    return list(iter_chunks(text, chunk_size, overlap))
+
+def iter_chunks(text: str, chunk_size: int = 1000, overlap: int = 200) -> Iterator[str]:
+    """Yield the chunks of chunk_text one at a time"""
+    if len(text) <= chunk_size:
+        yield text
+        return
+    
+    for start, end in _chunk_spans(text, chunk_size, overlap):
+        chunk = text[start:end].strip()
+        if chunk:
+            yield chunk
+
+def _chunk_spans(text: str, chunk_size: int, overlap: int) -> Iterator[Tuple[int, int]]:
+    """Start and end offsets of each chunk, cut at sentence or word boundaries where possible"""
+    # Index sentence endings and word boundaries in one scan each, then
+    # find every chunk's cut point by bisection instead of rescanning the window
+    sentence_ends = [match.start() for match in _SENTENCE_END_RE.finditer(text)]
+    spaces = [match.start() for match in _SPACE_RE.finditer(text)]
+    
     start = 0
+    text_length = len(text)
     
-    while start < len(text):
+    while start < text_length:
         end = start + chunk_size
         
         # Try to end at a sentence boundary
-        if end < len(text):
-            # Look for sentence endings
-            sentence_end = text.rfind('.', start, end)
-            if sentence_end != -1 and sentence_end > start + chunk_size // 2:
-                end = sentence_end + 1
+        if end < text_length:
+            # Last sentence ending before the window end
+            i = bisect_left(sentence_ends, end) - 1
+            if i >= 0 and sentence_ends[i] > start + chunk_size // 2:
+                end = sentence_ends[i] + 1
             else:
                 # Look for word boundaries
-                space_pos = text.rfind(' ', start, end)
-                if space_pos != -1 and space_pos > start + chunk_size // 2:
-                    end = space_pos
+                i = bisect_left(spaces, end) - 1
+                if i >= 0 and spaces[i] > start + chunk_size // 2:
+                    end = spaces[i]
         
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
+        yield start, end
         
         start = end - overlap
-        if start >= len(text):
+        if start >= text_length:
             break
-    
-    return chunks
+
+# Characters preprocess_text keeps: word characters, whitespace and basic punctuation
+_DISALLOWED_CHARS_RE = re.compile(r'[^\w\s\.\,\;\:\!\?\-\(\)]')
+_ASCII_KEPT = set(string.ascii_letters + string.digits + "_ .,;:!?-()")
+_ASCII_TRANSLATION = str.maketrans({chr(code): ' ' for code in range(128) if chr(code) not in _ASCII_KEPT})
 
 def preprocess_text(text: str) -> str:
     """Preprocess text for better embeddings"""
@@ -267,8 +677,11 @@ def preprocess_text(text: str) -> str:
     text = ' '.join(text.split())
     
     # Remove special characters that might interfere with embeddings
-    # Keep basic punctuation and alphanumeric characters
-    import re
-    text = re.sub(r'[^\w\s\.\,\;\:\!\?\-\(\)]', ' ', text)
+    # Keep basic punctuation and alphanumeric characters; ASCII text takes the
+    # single-pass translate table, anything else needs the Unicode-aware regex
+    if text.isascii():
+        text = text.translate(_ASCII_TRANSLATION)
+    else:
+        text = _DISALLOWED_CHARS_RE.sub(' ', text)
     
     return text.strip()
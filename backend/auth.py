@@ -1,10 +1,12 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 from dotenv import load_dotenv
 import os
+import time
 
 load_dotenv()
 
@@ -39,3 +41,18 @@ def verify_token(token: str, credentials_exception: HTTPException):
         return email
     except JWTError:
         raise credentials_exception
+
+@lru_cache(maxsize=4096)
+def _decode_token(token: str) -> Optional[dict]:
+    # Clients resend the same token on every call, so the signature is checked once per token
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+def verify_token_claims(token: str, credentials_exception: HTTPException) -> dict:
+    """Claims of a valid token; expiry is rechecked on every call since decodes are cached"""
+    payload = _decode_token(token)
+    if payload is None or payload.get("sub") is None or payload.get("exp", 0) <= time.time():
+        raise credentials_exception
+    return payload
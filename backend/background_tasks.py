@@ -1,8 +1,14 @@
 import asyncio
-from typing import Dict, Any
-from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import Paper, Note, Flashcard, MindMap
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, List
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from models import Paper, Note, Flashcard, MindMap, EmbeddingCache
 import sys
 import os
 from pathlib import Path
@@ -10,74 +16,227 @@ from pathlib import Path
 # Add parent directory to Python path to import ai modules
 sys.path.append(str(Path(__file__).parent.parent))
 
-from pdf_processor import process_uploaded_paper
+from pdf_processor import ExtractedPaper, process_uploaded_paper, process_uploaded_paper_pages, assemble_extracted_paper, pdf_page_count, warm_extraction_worker
 from ai.llm_processor import LLMProcessor
-from ai.vector_store import VectorStore, RAGProcessor, chunk_text, preprocess_text
+from ai.vector_store import VectorStore, RAGProcessor, EMBEDDING_MODEL_NAME, chunk_text, preprocess_text, quantize_int8, dequantize_int8
 import os
-import json
+import hashlib
+import math
+import logging
+import numpy as np
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+# Pages per extraction shard; PDFs up to this long are extracted in one process
+PAGES_PER_SHARD = 8
+
+# PDF extraction processes; each is a full interpreter, so the pool is capped rather than one per core
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Papers whose preprocessed chunks are kept for retries; each entry holds the full text
+CHUNK_CACHE_SIZE = 32
+
+# Bound on hashes per IN (...) lookup, below SQLite's host-parameter limit
+EMBEDDING_CACHE_LOOKUP_BATCH = 500
+
+def file_sha256(file_path: str) -> str:
+    """SHA-256 of a file's bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
 class PaperProcessor:
     def __init__(self):
         self.llm_processor = LLMProcessor()
         self.vector_store = VectorStore()
         self.rag_processor = RAGProcessor(self.vector_store)
+        
+        # Blocking work runs off the event loop: PDF parsing in worker processes (spawned, since
+        # this process already holds torch and several threads), embedding and Chroma writes on threads
+        self._cpu_pool = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        self._io_pool = ThreadPoolExecutor(max_workers=8)
+        
+        # Preprocessed text and chunks of recent papers, keyed by a hash of the extracted text
+        self._chunk_cache = OrderedDict()
+        self._chunk_cache_lock = threading.Lock()
     
-    async def process_paper(self, paper_id: int):
-        """Process a newly uploaded paper: extract content, generate embeddings, create study materials"""
-        db = SessionLocal()
+    async def process_paper(self, paper_id: int, db: AsyncSession = None):
+        """Process a newly uploaded paper: extract content, generate embeddings, create study materials
+        
+        Workers pass in their long-lived session; without one a session is opened for this paper only.
+        """
+        owns_session = db is None
+        if owns_session:
+            db = AsyncSessionLocal()
+        paper = None
         try:
-            # Get paper from database
-            paper = db.query(Paper).filter(Paper.id == paper_id).first()
+            # Get paper from database; the worker's session outlives this paper, so reload any copy
+            # it already holds rather than trusting it
+            paper = await db.get(Paper, paper_id, populate_existing=True)
             if not paper:
-                print(f"Paper with ID {paper_id} not found")
+                logger.warning("Paper with ID %s not found", paper_id)
                 return
             
-            print(f"Processing paper: {paper.title}")
+            logger.info("Processing paper: %s", paper.title, extra={"paper_id": paper_id})
             
             # Update status to processing
             paper.status = "processing"
-            db.commit()
+            await db.commit()
+            
+            # An identical PDF that was already processed supplies everything without extraction,
+            # LLM calls or embedding
+            loop = asyncio.get_running_loop()
+            paper.content_sha256 = await loop.run_in_executor(self._io_pool, file_sha256, paper.file_path)
+            duplicate = (await db.scalars(select(Paper).where(
+                Paper.content_sha256 == paper.content_sha256,
+                Paper.status == "ready",
+                Paper.id != paper.id
+            ).limit(1))).first()
+            if duplicate and await self._copy_from_duplicate(paper, duplicate, db):
+                logger.info("Reused processed duplicate %s for paper: %s", duplicate.id, paper.title, extra={"paper_id": paper_id})
+                return
             
             # Extract content from PDF
-            extracted_content = process_uploaded_paper(paper.file_path)
+            extracted_content = await self._extract(paper.file_path)
             
             # Update paper with extracted content
-            paper.title = extracted_content.title or paper.title
+            full_text = extracted_content.full_text
+            title = extracted_content.title or paper.title
+            paper.title = title
             paper.authors = extracted_content.authors
             paper.abstract = extracted_content.abstract
-            paper.full_text = extracted_content.full_text
-            paper.metadata = extracted_content.metadata
+            paper.full_text = full_text
+            paper.paper_metadata = extracted_content.metadata
             
-            # Generate study materials
-            await self._generate_study_materials(paper, extracted_content, db)
+            # Prepare metadata - ChromaDB doesn't accept None values
+            metadata = {
+                "authors": paper.authors or "Unknown",
+                "abstract": paper.abstract or "No abstract available",
+                "upload_date": paper.upload_date.isoformat() if paper.upload_date else "",
+                "file_path": paper.file_path or ""
+            }
             
-            # Process for vector search
-            await self._process_for_vector_search(paper, extracted_content)
+            # Generate study materials and index for vector search together, so chunking and
+            # embedding run while the LLM calls are in flight. Both take plain values copied from
+            # the paper; indexing runs on its own session, so it never reads this session's objects
+            _, indexed = await asyncio.gather(
+                self._generate_study_materials(paper_id, title, full_text, db),
+                self._process_for_vector_search(paper_id, title, full_text, metadata)
+            )
             
-            # Update status to ready
-            paper.status = "ready"
-            db.commit()
+            # Only a paper whose chunks made it into the vector store is ready; a retry re-upserts them
+            paper.status = "ready" if indexed else "error"
+            await db.commit()
             
-            print(f"Successfully processed paper: {paper.title}")
+            logger.info("Successfully processed paper: %s", title, extra={"paper_id": paper_id})
             
         except Exception as e:
-            print(f"Error processing paper {paper_id}: {str(e)}")
+            logger.exception("Error processing paper %s", paper_id, extra={"paper_id": paper_id})
+            # Discard the failed transaction so the session stays usable for the next paper
+            await db.rollback()
             # Update status to error
             if paper:
                 paper.status = "error"
-                paper.metadata = {"error": str(e)}
-                db.commit()
+                paper.paper_metadata = {"error": str(e)}
+                await db.commit()
         finally:
-            db.close()
+            if owns_session:
+                await db.close()
+    
+    async def warm_up(self):
+        """Start every extraction worker process before the first upload needs it"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(self._cpu_pool, warm_extraction_worker)
+            for _ in range(EXTRACTION_WORKERS)
+        ])
     
-    async def _generate_study_materials(self, paper: Paper, extracted_content, db: Session):
+    def close(self):
+        """Shut down the extraction processes and I/O threads"""
+        self._cpu_pool.shutdown(wait=True, cancel_futures=True)
+        self._io_pool.shutdown(wait=True, cancel_futures=True)
+    
+    async def extract_papers(self, file_paths: List[str]) -> List[ExtractedPaper]:
+        """Extract several PDFs in parallel on the shared process pool, in the order given"""
+        return list(await asyncio.gather(*[self._extract(file_path) for file_path in file_paths]))
+    
+    async def _extract(self, file_path: str):
+        """Extract a PDF, spreading the pages of long papers over the process pool"""
+        loop = asyncio.get_running_loop()
+        try:
+            page_count = await loop.run_in_executor(self._io_pool, pdf_page_count, file_path)
+        except Exception:
+            # PyMuPDF can't open the file; a whole-paper extraction still tries pdfplumber
+            logger.warning("Could not count pages of %s; extracting it in one process", file_path)
+            return await loop.run_in_executor(self._cpu_pool, process_uploaded_paper, file_path)
+        shard_count = min(EXTRACTION_WORKERS, math.ceil(page_count / PAGES_PER_SHARD))
+        if shard_count <= 1:
+            return await loop.run_in_executor(self._cpu_pool, process_uploaded_paper, file_path)
+        
+        shard_size = math.ceil(page_count / shard_count)
+        parts = await asyncio.gather(*[
+            loop.run_in_executor(self._cpu_pool, process_uploaded_paper_pages, file_path, start, start + shard_size)
+            for start in range(0, page_count, shard_size)
+        ])
+        pages_text = [page_text for part in parts for page_text in part]
+        # Title, authors, abstract and sections come from the merged pages, as in a single pass
+        return await loop.run_in_executor(self._cpu_pool, assemble_extracted_paper, file_path, pages_text)
+    
+    async def _copy_from_duplicate(self, paper: Paper, duplicate: Paper, db: AsyncSession) -> bool:
+        """Give paper the extracted content, study materials and vector entries of an identical upload"""
+        paper.title = duplicate.title
+        paper.authors = duplicate.authors
+        paper.abstract = duplicate.abstract
+        paper.full_text = duplicate.full_text
+        paper.paper_metadata = duplicate.paper_metadata
+        
+        # Copy the vector entries first; if that fails nothing has been written and the paper
+        # goes through the full pipeline instead
+        metadata = {
+            "upload_date": paper.upload_date.isoformat() if paper.upload_date else "",
+            "file_path": paper.file_path or ""
+        }
+        loop = asyncio.get_running_loop()
+        copied = await loop.run_in_executor(
+            self._io_pool, partial(self.vector_store.copy_paper, duplicate.id, paper.id, paper.title, metadata)
+        )
+        if not copied:
+            return False
+        
+        notes = [
+            {"paper_id": paper.id, "title": note.title, "content": note.content, "summary": note.summary, "key_takeaways": note.key_takeaways}
+            for note in await db.scalars(select(Note).where(Note.paper_id == duplicate.id))
+        ]
+        cards = [
+            {"paper_id": paper.id, "question": card.question, "answer": card.answer, "difficulty": card.difficulty, "category": card.category}
+            for card in await db.scalars(select(Flashcard).where(Flashcard.paper_id == duplicate.id))
+        ]
+        mind_maps = [
+            {"paper_id": paper.id, "title": mind_map.title, "structure": mind_map.structure}
+            for mind_map in await db.scalars(select(MindMap).where(MindMap.paper_id == duplicate.id))
+        ]
+        for model, rows in ((Note, notes), (Flashcard, cards), (MindMap, mind_maps)):
+            if rows:
+                await db.execute(insert(model), rows)
+        
+        paper.status = "ready"
+        await db.commit()
+        return True
+    
+    async def _generate_study_materials(self, paper_id: int, title: str, full_text: str, db: AsyncSession):
         """Generate notes, flashcards, and mind maps"""
         try:
-            # Generate study notes
-            study_notes = self.llm_processor.generate_study_notes(
-                extracted_content.full_text, 
-                paper.title
+            # The three generation calls are independent, so issue them concurrently
+            generated = await self.llm_processor.agenerate_all(
+                full_text,
+                title,
+                num_cards=8,
+                tasks=("study_notes", "flashcards", "mind_map")
             )
+            study_notes = generated["study_notes"]
             
             # Create note record
             # Ensure we handle the data properly for database insertion
@@ -87,139 +246,241 @@ class PaperProcessor:
             takeaways_data = study_notes.get('takeaways', []) if isinstance(study_notes, dict) else []
             
             note = Note(
-                paper_id=paper.id,
-                title=f"Study Notes: {paper.title}",
-                content=json.dumps(study_notes),
+                paper_id=paper_id,
+                title=f"Study Notes: {title}",
+                content=study_notes,
                 summary=summary_text,
-                key_takeaways=json.dumps(takeaways_data)  # Store as JSON string
+                key_takeaways=takeaways_data
             )
             db.add(note)
             
-            # Generate flashcards
-            flashcards_data = self.llm_processor.generate_flashcards(
-                extracted_content.full_text,
-                paper.title,
-                num_cards=8
-            )
-            
-            # Create flashcard records
-            for card_data in flashcards_data:
-                if isinstance(card_data, dict) and 'question' in card_data:
-                    flashcard = Flashcard(
-                        paper_id=paper.id,
-                        question=card_data['question'],
-                        answer=card_data['answer'],
-                        difficulty=card_data.get('difficulty', 'medium'),
-                        category=card_data.get('category', 'concept')
-                    )
-                    db.add(flashcard)
-            
-            # Generate mind map
-            mind_map_data = self.llm_processor.generate_mind_map(
-                extracted_content.full_text,
-                paper.title
-            )
+            # Create flashcard records with one multi-row INSERT rather than an ORM object per card
+            cards = [
+                {
+                    "paper_id": paper_id,
+                    "question": card_data['question'],
+                    "answer": card_data['answer'],
+                    "difficulty": card_data.get('difficulty', 'medium'),
+                    "category": card_data.get('category', 'concept')
+                }
+                for card_data in generated["flashcards"]
+                if isinstance(card_data, dict) and 'question' in card_data
+            ]
+            if cards:
+                await db.execute(insert(Flashcard), cards)
             
             # Create mind map record
             mind_map = MindMap(
-                paper_id=paper.id,
-                title=f"Mind Map: {paper.title}",
-                structure=mind_map_data
+                paper_id=paper_id,
+                title=f"Mind Map: {title}",
+                structure=generated["mind_map"]
             )
             db.add(mind_map)
             
-            db.commit()
-            print(f"Generated study materials for paper: {paper.title}")
+            await db.commit()
+            logger.info("Generated study materials for paper: %s", title, extra={"paper_id": paper_id})
             
-        except Exception as e:
-            print(f"Error generating study materials: {str(e)}")
-            db.rollback()
+        except Exception:
+            await db.rollback()
+            logger.exception("Error generating study materials", extra={"paper_id": paper_id})
     
-    async def _process_for_vector_search(self, paper: Paper, extracted_content):
-        """Process paper for vector search and RAG"""
+    async def _process_for_vector_search(self, paper_id: int, title: str, text: str, metadata: Dict[str, Any]) -> bool:
+        """Process paper for vector search and RAG, returning whether its chunks were stored"""
         try:
-            # Preprocess text
-            full_text = preprocess_text(extracted_content.full_text)
+            loop = asyncio.get_running_loop()
             
-            # Create chunks
-            chunks = chunk_text(full_text, chunk_size=1000, overlap=200)
+            # Preprocess text and create chunks
+            full_text, chunks = await loop.run_in_executor(self._io_pool, self._prepare_chunks, text)
             
-            # Prepare metadata - ChromaDB doesn't accept None values
-            metadata = {
-                "authors": paper.authors or "Unknown",
-                "abstract": paper.abstract or "No abstract available",
-                "upload_date": paper.upload_date.isoformat() if paper.upload_date else "",
-                "file_path": paper.file_path or ""
-            }
+            # Identical chunks seen in earlier uploads reuse their stored vectors
+            embeddings = await self._embed_with_cache(chunks)
             
             # Add to vector store
-            success = self.vector_store.add_paper(
-                paper_id=paper.id,
-                title=paper.title,
+            success = await loop.run_in_executor(self._io_pool, partial(
+                self.vector_store.add_paper,
+                paper_id=paper_id,
+                title=title,
                 content=full_text,
                 chunks=chunks,
-                metadata=metadata
-            )
+                metadata=metadata,
+                embeddings=embeddings
+            ))
             
             if success:
-                print(f"Added paper to vector store: {paper.title}")
+                logger.info("Added paper to vector store: %s", title, extra={"paper_id": paper_id})
             else:
-                print(f"Failed to add paper to vector store: {paper.title}")
+                logger.error("Failed to add paper to vector store: %s", title, extra={"paper_id": paper_id})
+            return success
                 
-        except Exception as e:
-            print(f"Error processing paper for vector search: {str(e)}")
+        except Exception:
+            logger.exception("Error processing paper for vector search", extra={"paper_id": paper_id})
+            return False
+
+    def _prepare_chunks(self, text: str):
+        # Retries and re-processing see the same extracted text, so reuse its chunks
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        with self._chunk_cache_lock:
+            if key in self._chunk_cache:
+                self._chunk_cache.move_to_end(key)
+                return self._chunk_cache[key]
+        
+        full_text = preprocess_text(text)
+        prepared = (full_text, chunk_text(full_text, chunk_size=1000, overlap=200))
+        
+        with self._chunk_cache_lock:
+            self._chunk_cache[key] = prepared
+            if len(self._chunk_cache) > CHUNK_CACHE_SIZE:
+                self._chunk_cache.popitem(last=False)
+        return prepared
+    
+    async def _embed_with_cache(self, chunks: List[str]) -> np.ndarray:
+        """Embed chunks, only running the model for content not already in the embedding cache"""
+        if not chunks:
+            return np.empty((0, self.vector_store.embedding_model.get_sentence_embedding_dimension()), dtype=np.float32)
+        
+        # A session of its own: an AsyncSession can't serve two coroutines at once, and study
+        # material generation is using the worker's session concurrently
+        async with AsyncSessionLocal() as db:
+            return await self._embed_with_cache_session(chunks, db)
+    
+    async def _embed_with_cache_session(self, chunks: List[str], db: AsyncSession) -> np.ndarray:
+        hashes = [hashlib.sha256(chunk.encode()).hexdigest() for chunk in chunks]
+        vectors = {}
+        distinct_hashes = list(dict.fromkeys(hashes))
+        for start in range(0, len(distinct_hashes), EMBEDDING_CACHE_LOOKUP_BATCH):
+            rows = await db.execute(select(EmbeddingCache.sha256, EmbeddingCache.vector, EmbeddingCache.scale).where(
+                EmbeddingCache.model == EMBEDDING_MODEL_NAME,
+                EmbeddingCache.sha256.in_(distinct_hashes[start:start + EMBEDDING_CACHE_LOOKUP_BATCH])
+            ))
+            for sha256, vector, scale in rows:
+                if scale is None:
+                    vectors[sha256] = np.frombuffer(vector, dtype=np.float32)
+                else:
+                    vectors[sha256] = dequantize_int8(np.frombuffer(vector, dtype=np.int8), np.float32(scale))
+        
+        # Embed each missing chunk once, however often it repeats
+        missing = {sha256: chunk for sha256, chunk in zip(hashes, chunks) if sha256 not in vectors}
+        if missing:
+            loop = asyncio.get_running_loop()
+            fresh = await loop.run_in_executor(self._io_pool, self.vector_store.embed_many, list(missing.values()))
+            # Stored as int8 codes with a per-vector scale, a quarter of the float32 size
+            codes, scales = quantize_int8(fresh)
+            for sha256, vector, code, scale in zip(missing, fresh, codes, scales):
+                vectors[sha256] = vector
+                db.add(EmbeddingCache(
+                    model=EMBEDDING_MODEL_NAME,
+                    sha256=sha256,
+                    dim=vector.shape[0],
+                    vector=code.tobytes(),
+                    scale=float(scale[0])
+                ))
+            try:
+                await db.commit()
+            except SQLAlchemyError as e:
+                # Another upload stored the same chunk first; the vectors are still usable
+                await db.rollback()
+                logger.warning("Could not update embedding cache: %s", e)
+        
+        return np.stack([vectors[sha256] for sha256 in hashes])
+
+# Upload size bins (bytes) so long papers queue separately and never hold up short ones
+PAPER_SIZE_BINS = (("S", 200 * 1024), ("M", 2 * 1024 * 1024), ("L", None))
+
+def size_bin(file_size: int = None) -> str:
+    """Name of the size bin a paper of file_size bytes is queued in"""
+    for name, limit in PAPER_SIZE_BINS:
+        if limit is None or (file_size or 0) < limit:
+            return name
+
+# Queued by stop() to tell a worker to exit
+SHUTDOWN_TASK = {'type': '__shutdown__'}
 
 class BackgroundTaskManager:
-    def __init__(self):
+    def __init__(self, concurrency: int = None):
         self.paper_processor = PaperProcessor()
-        self.task_queue = asyncio.Queue()
+        self.bins = {name: asyncio.Queue() for name, _ in PAPER_SIZE_BINS}
         self.running = False
+        # Papers ingested at once, spread over the bins with at least one worker each;
+        # each worker holds its own database session
+        self.concurrency = max(concurrency or min(4, os.cpu_count() or 1), len(self.bins))
+        self._workers = []
+        # Event loop the workers run on, which owns the queues
+        self.loop = None
     
     async def start(self):
         """Start the background task processor"""
         self.running = True
-        while self.running:
+        self.loop = asyncio.get_running_loop()
+        # Spawning the extraction processes is slow, so it starts now rather than on the first upload
+        warm_up = asyncio.create_task(self.paper_processor.warm_up())
+        bin_names = list(self.bins)
+        self._workers = []
+        for i in range(self.concurrency):
+            task_queue = self.bins[bin_names[i % len(bin_names)]]
+            self._workers.append((task_queue, asyncio.create_task(self._worker(task_queue))))
+        await asyncio.gather(warm_up, *(worker for _, worker in self._workers), return_exceptions=True)
+    
+    async def _worker(self, task_queue: asyncio.Queue):
+        # One session for the worker's lifetime instead of a connection checkout per paper
+        async with AsyncSessionLocal() as db:
+            await self._worker_loop(task_queue, db)
+    
+    async def _worker_loop(self, task_queue: asyncio.Queue, db: AsyncSession):
+        while True:
+            # Sleep until work arrives; no periodic wake-ups while idle
+            task = await task_queue.get()
+            
             try:
-                # Wait for a task with timeout
-                task = await asyncio.wait_for(self.task_queue.get(), timeout=1.0)
+                if task['type'] == SHUTDOWN_TASK['type']:
+                    return
                 
                 # Process the task
                 if task['type'] == 'process_paper':
-                    await self.paper_processor.process_paper(task['paper_id'])
-                
+                    await self.paper_processor.process_paper(task['paper_id'], db)
+            except Exception:
+                logger.exception("Error in background task")
+            finally:
                 # Mark task as done
-                self.task_queue.task_done()
-                
-            except asyncio.TimeoutError:
-                # No tasks in queue, continue
-                continue
-            except Exception as e:
-                print(f"Error in background task: {str(e)}")
+                task_queue.task_done()
     
     async def stop(self):
         """Stop the background task processor"""
+        if not self.running:
+            return
+        # Wait for current tasks to complete, then send each worker a shutdown task
+        for task_queue in self.bins.values():
+            await task_queue.join()
         self.running = False
-        # Wait for current tasks to complete
-        await self.task_queue.join()
+        for task_queue, _ in self._workers:
+            task_queue.put_nowait(SHUTDOWN_TASK)
+        await asyncio.gather(*(worker for _, worker in self._workers), return_exceptions=True)
+        self.paper_processor.close()
     
-    async def add_paper_processing_task(self, paper_id: int):
-        """Add a paper processing task to the queue"""
-        await self.task_queue.put({
+    async def add_paper_processing_task(self, paper_id: int, file_size: int = None):
+        """Add a paper processing task to the queue for its size bin
+        
+        Callers run on the API's event loop, so the put is handed to the workers' loop.
+        """
+        task_queue = self.bins[size_bin(file_size)]
+        task = {
             'type': 'process_paper',
             'paper_id': paper_id
-        })
+        }
+        if self.loop is None:
+            # Workers not started yet; the queue binds to their loop on first use
+            task_queue.put_nowait(task)
+        else:
+            self.loop.call_soon_threadsafe(task_queue.put_nowait, task)
 
 # Global task manager instance
 task_manager = BackgroundTaskManager()
 
-async def process_paper_background(paper_id: int):
+async def process_paper_background(paper_id: int, file_size: int = None):
     """Add a paper processing task to the background queue"""
-    await task_manager.add_paper_processing_task(paper_id)
+    await task_manager.add_paper_processing_task(paper_id, file_size)
 
 def start_background_tasks():
     """Start background task processing"""
-    import threading
-    
     def run_background_tasks():
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
@@ -228,3 +489,13 @@ def start_background_tasks():
     background_thread = threading.Thread(target=run_background_tasks, daemon=True)
     background_thread.start()
     return background_thread
+
+def stop_background_tasks():
+    """Finish queued papers, stop the workers and close the processing pools
+    
+    Blocks the calling thread; the stop runs on the workers' own loop, which owns the queues.
+    """
+    if task_manager.loop is None:
+        task_manager.paper_processor.close()
+        return
+    asyncio.run_coroutine_threadsafe(task_manager.stop(), task_manager.loop).result()
@@ -1,21 +1,39 @@
 import sys
 import os
 import json
+import asyncio
+import hashlib
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
 os.environ['ANONYMIZED_TELEMETRY'] = 'false'
 os.environ['CHROMA_TELEMETRY'] = 'false'
 sys.path.append(str(Path(__file__).parent.parent))
 
-from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Form
+# PDF extraction runs in spawned processes, which re-run the main script; as a script this module
+# would rebuild the whole app (models, pools, workers) in every one of them
+if __name__ == "__main__":
+    sys.exit("Start the API with: python -m uvicorn main:app --host 0.0.0.0 --port 8000")
+
+from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Form, Request, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List, Optional
-import shutil
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy import select, insert, update, cast, exists, func, case, or_, Text, inspect, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, raiseload
+from typing import List, Optional, Dict
+import anyio
+import orjson
+import aiofiles
+import httpx
 from datetime import datetime
 
-from database import engine, get_db
+from database import engine, get_db, ApiSessionLocal
 from models import Base, User, Paper, Note, Flashcard, MindMap, StudyPlan, StudySession, ChatSession, ChatMessage, Insight
 from schemas import (
     UserCreate, UserLogin, User as UserSchema, Token,
@@ -28,15 +46,91 @@ from schemas import (
     ChatSessionCreate, ChatSession as ChatSessionSchema,
     ChatMessageCreate, ChatMessage as ChatMessageSchema,
     InsightCreate, Insight as InsightSchema,
-    QuestionAnswerRequest, QuestionAnswerResponse
+    QuestionAnswerRequest, QuestionAnswerResponse,
+    BatchRequest, BatchResponse, BatchResponseItem
 )
-from auth import verify_password, get_password_hash, create_access_token, verify_token
-from background_tasks import process_paper_background, start_background_tasks
+from auth import verify_password, get_password_hash, create_access_token, verify_token_claims
+from background_tasks import process_paper_background, start_background_tasks, stop_background_tasks
 from ai.llm_processor import LLMProcessor
 from ai.vector_store import VectorStore, RAGProcessor
 
+# Log records are queued and written to stderr by a listener thread, so request handlers
+# and the ingest workers never block on console I/O
+log_queue = queue.Queue(-1)
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(log_queue)])
+log_listener = QueueListener(log_queue, logging.StreamHandler(), respect_handler_level=True)
+log_listener.start()
+
 Base.metadata.create_all(bind=engine)
 
+def migrate_insight_related_papers():
+    """Decode related_papers values that older versions stored as JSON-encoded strings"""
+    with engine.begin() as conn:
+        # A JSON string value serializes with a leading quote; lists and nulls don't
+        rows = conn.execute(
+            select(Insight.id, Insight.related_papers)
+            .where(cast(Insight.related_papers, Text).like('"%'))
+        ).all()
+        for insight_id, related_papers in rows:
+            try:
+                related_papers = json.loads(related_papers)
+            except (json.JSONDecodeError, TypeError):
+                related_papers = []
+            conn.execute(update(Insight).where(Insight.id == insight_id).values(related_papers=related_papers))
+
+def migrate_paper_content_sha256():
+    """Add the upload hash column to papers tables created before duplicate detection"""
+    columns = {column["name"] for column in inspect(engine).get_columns("papers")}
+    if "content_sha256" in columns:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE papers ADD COLUMN content_sha256 VARCHAR"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_papers_content_sha256 ON papers (content_sha256)"))
+
+def migrate_note_content():
+    """Convert notes stored before content became a JSON column
+    
+    User-written notes held plain text, which is re-encoded as a JSON string; generated notes
+    and takeaways held json.dumps output, which is decoded into the object it encodes.
+    """
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("UPDATE notes SET content = json_quote(content) WHERE json_valid(content) = 0"))
+        elif engine.dialect.name == "postgresql":
+            content_column = next(column for column in inspect(conn).get_columns("notes") if column["name"] == "content")
+            if not isinstance(content_column["type"], JSONB):
+                conn.execute(text("ALTER TABLE notes ALTER COLUMN content TYPE jsonb USING to_jsonb(content)"))
+        
+        rows = conn.execute(
+            select(Note.id, Note.content, Note.key_takeaways)
+            .where(or_(cast(Note.content, Text).like('"{%'), cast(Note.key_takeaways, Text).like('"%')))
+        ).all()
+        for note_id, content, key_takeaways in rows:
+            values = {}
+            for column, value, expected in (("content", content, dict), ("key_takeaways", key_takeaways, list)):
+                if not isinstance(value, str):
+                    continue
+                try:
+                    decoded = json.loads(value)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(decoded, expected):
+                    values[column] = decoded
+            if values:
+                conn.execute(update(Note).where(Note.id == note_id).values(**values))
+
+def create_missing_indexes():
+    """Create model indexes that tables from older versions lack; create_all skips existing tables"""
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+migrate_insight_related_papers()
+migrate_paper_content_sha256()
+migrate_note_content()
+create_missing_indexes()
+
 llm_processor = LLMProcessor()
 vector_store = VectorStore()
 rag_processor = RAGProcessor(vector_store)
@@ -46,9 +140,21 @@ start_background_tasks()
 app = FastAPI(
     title="Research Pilot API",
     description="Agentic Research Paper Intelligence Platform",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# Model weights are loaded at import; the first encode and the first index search still do
+# lazy setup, so run them before serving traffic
+@app.on_event("startup")
+async def warm_models():
+    await asyncio.to_thread(vector_store.warmup)
+
+# Queued papers are finished and the extraction processes shut down before the server exits
+@app.on_event("shutdown")
+async def stop_workers():
+    await asyncio.to_thread(stop_background_tasks)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -56,6 +162,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Security
@@ -65,24 +172,110 @@ security = HTTPBearer()
 STORAGE_PATH = os.getenv("STORAGE_PATH", "../storage")
 os.makedirs(STORAGE_PATH, exist_ok=True)
 
+# Uploads are copied to storage in 1 MiB reads and writes
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Most sub-requests one /batch call may carry
+MAX_BATCH_REQUESTS = 20
+
+# Largest page a paginated list request may ask for
+MAX_PAGE_SIZE = 200
+
+# List endpoints validate rows once and let pydantic-core write the JSON bytes directly,
+# skipping FastAPI's intermediate dicts and the stdlib encoder
+PAPER_LIST_ADAPTER = TypeAdapter(List[PaperSchema])
+NOTE_LIST_ADAPTER = TypeAdapter(List[NoteSchema])
+FLASHCARD_LIST_ADAPTER = TypeAdapter(List[FlashcardSchema])
+MINDMAP_LIST_ADAPTER = TypeAdapter(List[MindMapSchema])
+STUDY_PLAN_LIST_ADAPTER = TypeAdapter(List[StudyPlanSchema])
+STUDY_SESSION_LIST_ADAPTER = TypeAdapter(List[StudySessionSchema])
+CHAT_SESSION_LIST_ADAPTER = TypeAdapter(List[ChatSessionSchema])
+CHAT_MESSAGE_LIST_ADAPTER = TypeAdapter(List[ChatMessageSchema])
+INSIGHT_LIST_ADAPTER = TypeAdapter(List[InsightSchema])
+
+# Polled reads are revalidated on every request rather than served from the browser cache,
+# so status changes show up immediately; an unchanged body costs a 304 with no payload
+POLLED_CACHE_CONTROL = "private, no-cache"
+
+def json_list_response(adapter: TypeAdapter, rows, request: Optional[Request] = None) -> Response:
+    """Serialize ORM rows or dicts through a list schema adapter, with an ETag when given the request"""
+    body = adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+    if request is not None:
+        return etag_response(request, body)
+    return Response(body, media_type="application/json")
+
+def paginate(stmt, id_column, limit: Optional[int], cursor: Optional[int]):
+    """Keyset pagination, newest first: rows with ids below the cursor, plus one extra row to
+    tell whether another page follows. Without a limit the statement is returned unchanged"""
+    if limit is None:
+        return stmt
+    if cursor is not None:
+        stmt = stmt.where(id_column < cursor)
+    return stmt.order_by(id_column.desc()).limit(limit + 1)
+
+def paged_list_response(adapter: TypeAdapter, rows, limit: Optional[int], request: Optional[Request] = None) -> Response:
+    """List response for a paginate()d query; the id to pass as the next cursor goes in X-Next-Cursor"""
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+    response = json_list_response(adapter, rows, request)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return response
+
+def etag_response(request: Request, body: bytes) -> Response:
+    """JSON response tagged with a hash of its body; a matching If-None-Match gets an empty 304"""
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": POLLED_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+async def row_exists(db: AsyncSession, *criteria) -> bool:
+    """Whether any row matches the criteria, without loading it"""
+    return await db.scalar(select(exists().where(*criteria)))
+
+async def authorize_paper(db: AsyncSession, paper_id: int, user_id: int):
+    """404 unless the paper belongs to the user; handlers that need the row fetch it with the owner filter instead"""
+    if not await row_exists(db, Paper.id == paper_id, Paper.owner_id == user_id):
+        raise HTTPException(status_code=404, detail="Paper not found")
+
 # Dependency to get current user
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    token = credentials.credentials
-    email = verify_token(token, credentials_exception)
-    user = db.query(User).filter(User.email == email).first()
+    email = verify_token_claims(credentials.credentials, credentials_exception)["sub"]
+    user = await db.scalar(select(User).where(User.email == email))
     if user is None:
         raise credentials_exception
     return user
 
+# Dependency for handlers that only need the caller's id; reads it from the token instead of
+# loading the user row
+async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_db)) -> int:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    payload = verify_token_claims(credentials.credentials, credentials_exception)
+    if "uid" in payload:
+        return payload["uid"]
+    
+    # Tokens issued before the uid claim was added
+    user_id = await db.scalar(select(User.id).where(User.email == payload["sub"]))
+    if user_id is None:
+        raise credentials_exception
+    return user_id
+
 # Authentication endpoints
 @app.post("/auth/register", response_model=UserSchema)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -95,13 +288,13 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         preferences=user.preferences
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @app.post("/auth/login", response_model=Token)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if not db_user or not verify_password(user.password, db_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -109,21 +302,21 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token = create_access_token(data={"sub": db_user.email})
+    access_token = create_access_token(data={"sub": db_user.email, "uid": db_user.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 # User endpoints
 @app.get("/users/me", response_model=UserSchema)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
 
 @app.put("/users/me", response_model=UserSchema)
-def update_current_user(
+async def update_current_user(
     full_name: Optional[str] = None,
     learning_goals: Optional[str] = None,
     preferences: Optional[dict] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if full_name is not None:
         current_user.full_name = full_name
@@ -132,57 +325,66 @@ def update_current_user(
     if preferences is not None:
         current_user.preferences = preferences
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
     return current_user
 
 # Paper endpoints
-@app.post("/papers/upload", response_model=PaperSchema)
+@app.post("/papers/upload", response_model=PaperSchema, status_code=status.HTTP_202_ACCEPTED)
 async def upload_paper(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
-    # Save file
-    file_path = os.path.join(STORAGE_PATH, f"{current_user.id}_{file.filename}")
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Save file in chunks without blocking the event loop; counting bytes saves a stat afterwards
+    file_path = os.path.join(STORAGE_PATH, f"{current_user_id}_{file.filename}")
+    bytes_written = 0
+    async with aiofiles.open(file_path, "wb") as buffer:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await buffer.write(chunk)
+            bytes_written += len(chunk)
     
     # Create paper record
     db_paper = Paper(
         title=file.filename,
         file_path=file_path,
-        file_size=os.path.getsize(file_path),
-        owner_id=current_user.id,
+        file_size=bytes_written,
+        owner_id=current_user_id,
         status="processing"
     )
     db.add(db_paper)
-    db.commit()
-    db.refresh(db_paper)
+    await db.commit()
+    await db.refresh(db_paper)
     
-    # TODO: Process paper in background
-    # Trigger background processing
-    await process_paper_background(db_paper.id)
+    # Queue the paper for the ingest workers and return right away; the client polls its status
+    await process_paper_background(db_paper.id, db_paper.file_size)
     
     return db_paper
 
 @app.get("/papers", response_model=List[PaperSchema])
-def get_papers(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Paper).filter(Paper.owner_id == current_user.id).all()
+async def get_papers(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    papers = (await db.scalars(paginate(select(Paper).where(Paper.owner_id == current_user_id), Paper.id, limit, cursor))).all()
+    return paged_list_response(PAPER_LIST_ADAPTER, papers, limit, request)
 
 @app.get("/papers/{paper_id}", response_model=PaperSchema)
-def get_paper(paper_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    paper = db.query(Paper).filter(Paper.id == paper_id, Paper.owner_id == current_user.id).first()
+async def get_paper(paper_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    paper = await db.scalar(select(Paper).where(Paper.id == paper_id, Paper.owner_id == current_user_id))
     if not paper:
         raise HTTPException(status_code=404, detail="Paper not found")
     return paper
 
 @app.delete("/papers/{paper_id}")
-def delete_paper(paper_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    paper = db.query(Paper).filter(Paper.id == paper_id, Paper.owner_id == current_user.id).first()
+async def delete_paper(paper_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    paper = await db.scalar(select(Paper).where(Paper.id == paper_id, Paper.owner_id == current_user_id))
     if not paper:
         raise HTTPException(status_code=404, detail="Paper not found")
     
@@ -190,112 +392,152 @@ def delete_paper(paper_id: int, current_user: User = Depends(get_current_user),
     if os.path.exists(paper.file_path):
         os.remove(paper.file_path)
     
-    db.delete(paper)
-    db.commit()
+    await db.delete(paper)
+    await db.commit()
     return {"message": "Paper deleted successfully"}
 
 # Notes endpoints
 @app.post("/papers/{paper_id}/notes", response_model=NoteSchema)
-def create_note(
+async def create_note(
     paper_id: int,
     note: NoteCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    paper = db.query(Paper).filter(Paper.id == paper_id, Paper.owner_id == current_user.id).first()
-    if not paper:
-        raise HTTPException(status_code=404, detail="Paper not found")
+    await authorize_paper(db, paper_id, current_user_id)
     
-    db_note = Note(**note.dict(), paper_id=paper_id)
+    db_note = Note(**note.model_dump(), paper_id=paper_id)
     db.add(db_note)
-    db.commit()
-    db.refresh(db_note)
+    await db.commit()
+    await db.refresh(db_note)
     return db_note
 
 @app.get("/papers/{paper_id}/notes", response_model=List[NoteSchema])
-def get_notes(paper_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    paper = db.query(Paper).filter(Paper.id == paper_id, Paper.owner_id == current_user.id).first()
-    if not paper:
-        raise HTTPException(status_code=404, detail="Paper not found")
+async def get_notes(
+    paper_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    await authorize_paper(db, paper_id, current_user_id)
     
-    return db.query(Note).filter(Note.paper_id == paper_id).all()
+    notes = (await db.scalars(paginate(select(Note).where(Note.paper_id == paper_id), Note.id, limit, cursor))).all()
+    return paged_list_response(NOTE_LIST_ADAPTER, notes, limit)
 
 # Flashcards endpoints
 @app.post("/papers/{paper_id}/flashcards", response_model=FlashcardSchema)
-def create_flashcard(
+async def create_flashcard(
     paper_id: int,
     flashcard: FlashcardCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    paper = db.query(Paper).filter(Paper.id == paper_id, Paper.owner_id == current_user.id).first()
-    if not paper:
-        raise HTTPException(status_code=404, detail="Paper not found")
+    await authorize_paper(db, paper_id, current_user_id)
     
-    db_flashcard = Flashcard(**flashcard.dict(), paper_id=paper_id)
+    db_flashcard = Flashcard(**flashcard.model_dump(), paper_id=paper_id)
     db.add(db_flashcard)
-    db.commit()
-    db.refresh(db_flashcard)
+    await db.commit()
+    await db.refresh(db_flashcard)
     return db_flashcard
 
 @app.get("/papers/{paper_id}/flashcards", response_model=List[FlashcardSchema])
-def get_flashcards(paper_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    paper = db.query(Paper).filter(Paper.id == paper_id, Paper.owner_id == current_user.id).first()
-    if not paper:
-        raise HTTPException(status_code=404, detail="Paper not found")
+async def get_flashcards(paper_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    await authorize_paper(db, paper_id, current_user_id)
     
-    return db.query(Flashcard).filter(Flashcard.paper_id == paper_id).all()
+    return json_list_response(FLASHCARD_LIST_ADAPTER, (await db.scalars(select(Flashcard).where(Flashcard.paper_id == paper_id))).all())
 
 # Mind Maps endpoints
 @app.post("/papers/{paper_id}/mindmaps", response_model=MindMapSchema)
-def create_mindmap(
+async def create_mindmap(
     paper_id: int,
     mindmap: MindMapCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    paper = db.query(Paper).filter(Paper.id == paper_id, Paper.owner_id == current_user.id).first()
-    if not paper:
-        raise HTTPException(status_code=404, detail="Paper not found")
+    await authorize_paper(db, paper_id, current_user_id)
     
-    db_mindmap = MindMap(**mindmap.dict(), paper_id=paper_id)
+    db_mindmap = MindMap(**mindmap.model_dump(), paper_id=paper_id)
     db.add(db_mindmap)
-    db.commit()
-    db.refresh(db_mindmap)
+    await db.commit()
+    await db.refresh(db_mindmap)
     return db_mindmap
 
 @app.get("/papers/{paper_id}/mindmaps", response_model=List[MindMapSchema])
-def get_mindmaps(paper_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    paper = db.query(Paper).filter(Paper.id == paper_id, Paper.owner_id == current_user.id).first()
-    if not paper:
+async def get_mindmaps(paper_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    await authorize_paper(db, paper_id, current_user_id)
+    
+    return json_list_response(MINDMAP_LIST_ADAPTER, (await db.scalars(select(MindMap).where(MindMap.paper_id == paper_id))).all())
+
+# Streamed generation endpoints
+async def iterate_in_thread(iterator):
+    """Step a blocking iterator off the event loop"""
+    while (item := await anyio.to_thread.run_sync(next, iterator, None)) is not None:
+        yield item
+
+async def paper_text(db: AsyncSession, paper_id: int, user_id: int):
+    """Title and full text of a user's paper, or 404"""
+    row = (await db.execute(
+        select(Paper.title, Paper.full_text).where(Paper.id == paper_id, Paper.owner_id == user_id)
+    )).first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Paper not found")
+    return row.title or "", row.full_text or ""
+
+@app.get("/papers/{paper_id}/summary/stream")
+async def stream_summary(paper_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    """Server-sent events: summary text tokens as they are generated, then a done event"""
+    title, full_text = await paper_text(db, paper_id, current_user_id)
+    
+    async def event_generator():
+        async for token in iterate_in_thread(llm_processor.generate_summary_stream(full_text, title)):
+            yield b"data: " + orjson.dumps({"token": token}) + b"\n\n"
+        yield b"data: " + orjson.dumps({"done": True}) + b"\n\n"
     
-    return db.query(MindMap).filter(MindMap.paper_id == paper_id).all()
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+@app.get("/papers/{paper_id}/flashcards/stream")
+async def stream_flashcards(
+    paper_id: int,
+    num_cards: int = Query(10, ge=1, le=50),
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """Server-sent events: one event per flashcard as soon as it is complete, then a done event.
+    Cards are not saved; POST /papers/{paper_id}/flashcards stores the ones the user keeps."""
+    title, full_text = await paper_text(db, paper_id, current_user_id)
+    
+    async def event_generator():
+        async for card in iterate_in_thread(llm_processor.generate_flashcards_stream(full_text, title, num_cards)):
+            yield b"data: " + orjson.dumps({"flashcard": card}) + b"\n\n"
+        yield b"data: " + orjson.dumps({"done": True}) + b"\n\n"
+    
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 # Study Plan endpoints
 @app.post("/study-plans", response_model=StudyPlanSchema)
-def create_study_plan(
+async def create_study_plan(
     plan: StudyPlanCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    db_plan = StudyPlan(**plan.dict(), user_id=current_user.id)
+    db_plan = StudyPlan(**plan.model_dump(), user_id=current_user_id)
     db.add(db_plan)
-    db.commit()
-    db.refresh(db_plan)
-    return db_plan
+    await db.commit()
+    await db.refresh(db_plan)
+    return study_plan_with_progress(db_plan, 0, 0)
 
 @app.post("/study-plans/generate", response_model=StudyPlanSchema)
-def generate_study_plan(
+async def generate_study_plan(
     goal: str,
     deadline: Optional[str] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
     """Generate an AI-powered study plan based on user's papers and goals"""
     try:
         # Get user's papers
-        papers = db.query(Paper).filter(Paper.owner_id == current_user.id).all()
+        papers = (await db.scalars(select(Paper).where(Paper.owner_id == current_user_id))).all()
         papers_data = [
             {
                 "title": paper.title,
@@ -307,58 +549,83 @@ def generate_study_plan(
         ]
         
         # Generate study plan using LLM
-        plan_data = llm_processor.generate_study_plan(goal, papers_data, deadline)
+        plan_data = await asyncio.to_thread(llm_processor.generate_study_plan, goal, papers_data, deadline)
         
         # Create study plan record
         db_plan = StudyPlan(
-            user_id=current_user.id,
+            user_id=current_user_id,
             title=plan_data.get("plan_title", f"Study Plan: {goal}"),
             description=f"AI-generated study plan for: {goal}",
             goal=goal,
             deadline=deadline,
             schedule=plan_data.get("weekly_schedule", []),
-            progress={"completed_weeks": 0, "total_weeks": len(plan_data.get("weekly_schedule", []))},
             status="active"
         )
         db.add(db_plan)
-        db.commit()
-        db.refresh(db_plan)
+        await db.flush()
         
-        # Create study sessions from the plan
-        for week_data in plan_data.get("weekly_schedule", []):
-            session = StudySession(
-                plan_id=db_plan.id,
-                title=f"Week {week_data.get('week', 1)}: {week_data.get('focus', 'Study Session')}",
-                description=f"Tasks: {', '.join(week_data.get('tasks', []))}",
-                scheduled_date=datetime.utcnow(),  # You might want to calculate actual dates
-                status="scheduled"
-            )
-            db.add(session)
+        # Create study sessions from the plan in one executemany, committed with the plan
+        sessions = [
+            {
+                "plan_id": db_plan.id,
+                "title": f"Week {week_data.get('week', 1)}: {week_data.get('focus', 'Study Session')}",
+                "description": f"Tasks: {', '.join(week_data.get('tasks', []))}",
+                "scheduled_date": datetime.utcnow(),  # You might want to calculate actual dates
+                "status": "scheduled"
+            }
+            for week_data in plan_data.get("weekly_schedule", [])
+        ]
+        if sessions:
+            await db.execute(insert(StudySession), sessions)
         
-        db.commit()
-        return db_plan
+        await db.commit()
+        await db.refresh(db_plan)
+        return study_plan_with_progress(db_plan, 0, len(sessions))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating study plan: {str(e)}")
 
+# Plan progress is derived from its sessions at read time rather than stored, so it can't go stale
+def study_plans_with_session_counts():
+    """Select study plans with their completed and total session counts in one GROUP BY"""
+    return (
+        select(
+            StudyPlan,
+            func.count(case((StudySession.status == "completed", StudySession.id))),
+            func.count(StudySession.id)
+        )
+        .outerjoin(StudySession, StudySession.plan_id == StudyPlan.id)
+        .options(raiseload("*"))
+        .group_by(StudyPlan.id)
+    )
+
+def study_plan_with_progress(plan: StudyPlan, completed_sessions: int, total_sessions: int) -> StudyPlanSchema:
+    return StudyPlanSchema.model_validate(plan).model_copy(
+        update={"progress": {"completed_weeks": completed_sessions, "total_weeks": total_sessions}}
+    )
+
 @app.get("/study-plans", response_model=List[StudyPlanSchema])
-def get_study_plans(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(StudyPlan).filter(StudyPlan.user_id == current_user.id).all()
+async def get_study_plans(request: Request, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    rows = await db.execute(study_plans_with_session_counts().where(StudyPlan.user_id == current_user_id))
+    plans = [study_plan_with_progress(plan, completed, total) for plan, completed, total in rows]
+    return json_list_response(STUDY_PLAN_LIST_ADAPTER, plans, request)
 
 @app.get("/study-plans/{plan_id}", response_model=StudyPlanSchema)
-def get_study_plan(plan_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    plan = db.query(StudyPlan).filter(StudyPlan.id == plan_id, StudyPlan.user_id == current_user.id).first()
-    if not plan:
+async def get_study_plan(plan_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    row = (await db.execute(
+        study_plans_with_session_counts().where(StudyPlan.id == plan_id, StudyPlan.user_id == current_user_id)
+    )).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Study plan not found")
-    return plan
+    return study_plan_with_progress(*row)
 
 # Generate insights endpoint
 @app.post("/insights/generate")
-def generate_insights(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def generate_insights(current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
     """Generate insights from user's papers"""
     try:
         # Get user's papers
-        papers = db.query(Paper).filter(Paper.owner_id == current_user.id).all()
+        papers = (await db.scalars(select(Paper).where(Paper.owner_id == current_user_id))).all()
         papers_data = []
         
         for paper in papers:
@@ -374,7 +641,7 @@ def generate_insights(current_user: User = Depends(get_current_user), db: Sessio
             return {"message": "No papers found for analysis"}
         
         # Generate insights using LLM
-        insights_data = llm_processor.analyze_insights(papers_data)
+        insights_data = await asyncio.to_thread(llm_processor.analyze_insights, papers_data)
         
         # Ensure insights_data is not None and is a list
         if not insights_data or not isinstance(insights_data, list):
@@ -388,8 +655,8 @@ def generate_insights(current_user: User = Depends(get_current_user), db: Sessio
                 }
             ]
         
-        # Store insights in database
-        stored_count = 0
+        # Store insights in database with one executemany
+        insights = []
         for insight_data in insights_data:
             if isinstance(insight_data, dict) and "title" in insight_data:
                 # Ensure related_papers is properly serialized
@@ -397,20 +664,20 @@ def generate_insights(current_user: User = Depends(get_current_user), db: Sessio
                 if not isinstance(related_papers, list):
                     related_papers = []
                 
-                insight = Insight(
-                    user_id=current_user.id,
-                    title=insight_data.get("title", "Research Insight"),
-                    content=insight_data.get("description", "Generated insight"),
-                    type=insight_data.get("type", "trend"),
-                    relevance_score=min(max(insight_data.get("relevance_score", 5), 1), 10),  # Ensure 1-10 range
-                    related_papers=json.dumps(related_papers),  # Store as JSON string
-                    is_read=False
-                )
-                db.add(insight)
-                stored_count += 1
+                insights.append({
+                    "user_id": current_user_id,
+                    "title": insight_data.get("title", "Research Insight"),
+                    "content": insight_data.get("description", "Generated insight"),
+                    "type": insight_data.get("type", "trend"),
+                    "relevance_score": min(max(insight_data.get("relevance_score", 5), 1), 10),  # Ensure 1-10 range
+                    "related_papers": related_papers,
+                    "is_read": False
+                })
         
-        db.commit()
-        return {"message": f"Generated {stored_count} insights"}
+        if insights:
+            await db.execute(insert(Insight), insights)
+        await db.commit()
+        return {"message": f"Generated {len(insights)} insights"}
         
     except Exception as e:
         import traceback
@@ -420,144 +687,174 @@ def generate_insights(current_user: User = Depends(get_current_user), db: Sessio
 
 # Get paper analysis endpoint
 @app.get("/papers/{paper_id}/analysis")
-def get_paper_analysis(paper_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_paper_analysis(paper_id: int, request: Request, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
     """Get comprehensive analysis of a paper"""
-    paper = db.query(Paper).filter(Paper.id == paper_id, Paper.owner_id == current_user.id).first()
+    # Load notes, flashcards, and mind maps with the paper; any other relationship access raises
+    paper = await db.scalar(
+        select(Paper)
+        .options(
+            selectinload(Paper.notes),
+            selectinload(Paper.flashcards),
+            selectinload(Paper.mind_maps),
+            raiseload("*")
+        )
+        .where(Paper.id == paper_id, Paper.owner_id == current_user_id)
+    )
     if not paper:
         raise HTTPException(status_code=404, detail="Paper not found")
     
-    # Get notes, flashcards, and mind maps
-    notes = db.query(Note).filter(Note.paper_id == paper_id).all()
-    flashcards = db.query(Flashcard).filter(Flashcard.paper_id == paper_id).all()
-    mind_maps = db.query(MindMap).filter(MindMap.paper_id == paper_id).all()
-    
-    return {
-        "paper": paper,
-        "notes": notes,
-        "flashcards": flashcards,
-        "mind_maps": mind_maps,
+    analysis = {
+        "paper": PaperSchema.model_validate(paper).model_dump(mode="json"),
+        "notes": NOTE_LIST_ADAPTER.dump_python(NOTE_LIST_ADAPTER.validate_python(paper.notes, from_attributes=True), mode="json"),
+        "flashcards": FLASHCARD_LIST_ADAPTER.dump_python(FLASHCARD_LIST_ADAPTER.validate_python(paper.flashcards, from_attributes=True), mode="json"),
+        "mind_maps": MINDMAP_LIST_ADAPTER.dump_python(MINDMAP_LIST_ADAPTER.validate_python(paper.mind_maps, from_attributes=True), mode="json"),
         "analysis_complete": paper.status == "ready"
     }
+    return etag_response(request, orjson.dumps(analysis))
 
 # Study Session endpoints
 @app.post("/study-sessions", response_model=StudySessionSchema)
-def create_study_session(
+async def create_study_session(
     session: StudySessionCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    plan = db.query(StudyPlan).filter(StudyPlan.id == session.plan_id, StudyPlan.user_id == current_user.id).first()
-    if not plan:
+    if not await row_exists(db, StudyPlan.id == session.plan_id, StudyPlan.user_id == current_user_id):
         raise HTTPException(status_code=404, detail="Study plan not found")
     
-    db_session = StudySession(**session.dict())
+    db_session = StudySession(**session.model_dump())
     db.add(db_session)
-    db.commit()
-    db.refresh(db_session)
+    await db.commit()
+    await db.refresh(db_session)
     return db_session
 
 @app.get("/study-sessions", response_model=List[StudySessionSchema])
-def get_study_sessions(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user_plan_ids = [plan.id for plan in db.query(StudyPlan).filter(StudyPlan.user_id == current_user.id).all()]
-    return db.query(StudySession).filter(StudySession.plan_id.in_(user_plan_ids)).all()
+async def get_study_sessions(current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    sessions = (await db.scalars(
+        select(StudySession)
+        .join(StudyPlan, StudySession.plan_id == StudyPlan.id)
+        .options(raiseload("*"))
+        .where(StudyPlan.user_id == current_user_id)
+    )).all()
+    return json_list_response(STUDY_SESSION_LIST_ADAPTER, sessions)
 
 # Chat endpoints
 @app.post("/chat/sessions", response_model=ChatSessionSchema)
-def create_chat_session(
+async def create_chat_session(
     session: ChatSessionCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
     if session.paper_id:
-        paper = db.query(Paper).filter(Paper.id == session.paper_id, Paper.owner_id == current_user.id).first()
-        if not paper:
-            raise HTTPException(status_code=404, detail="Paper not found")
+        await authorize_paper(db, session.paper_id, current_user_id)
     
-    db_session = ChatSession(**session.dict(), user_id=current_user.id)
+    db_session = ChatSession(**session.model_dump(), user_id=current_user_id)
     db.add(db_session)
-    db.commit()
-    db.refresh(db_session)
+    await db.commit()
+    await db.refresh(db_session)
     return db_session
 
 @app.get("/chat/sessions", response_model=List[ChatSessionSchema])
-def get_chat_sessions(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(ChatSession).filter(ChatSession.user_id == current_user.id).all()
+async def get_chat_sessions(current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    return json_list_response(CHAT_SESSION_LIST_ADAPTER, (await db.scalars(select(ChatSession).where(ChatSession.user_id == current_user_id))).all())
 
 @app.post("/chat/message", response_model=ChatMessageSchema)
-def create_chat_message(
+async def create_chat_message(
     message: ChatMessageCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    session = db.query(ChatSession).filter(ChatSession.id == message.session_id, ChatSession.user_id == current_user.id).first()
-    if not session:
+    if not await row_exists(db, ChatSession.id == message.session_id, ChatSession.user_id == current_user_id):
         raise HTTPException(status_code=404, detail="Chat session not found")
     
-    db_message = ChatMessage(**message.dict())
+    db_message = ChatMessage(**message.model_dump())
     db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
+    await db.commit()
+    await db.refresh(db_message)
     return db_message
 
 @app.get("/chat/sessions/{session_id}/messages", response_model=List[ChatMessageSchema])
-def get_chat_messages(session_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    session = db.query(ChatSession).filter(ChatSession.id == session_id, ChatSession.user_id == current_user.id).first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Chat session not found")
+async def get_chat_messages(
+    session_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    if limit is None:
+        # Whole conversation: load it with the session
+        session = await db.scalar(
+            select(ChatSession)
+            .options(selectinload(ChatSession.messages), raiseload("*"))
+            .where(ChatSession.id == session_id, ChatSession.user_id == current_user_id)
+        )
+        if not session:
+            raise HTTPException(status_code=404, detail="Chat session not found")
+        return json_list_response(CHAT_MESSAGE_LIST_ADAPTER, session.messages)
     
-    return db.query(ChatMessage).filter(ChatMessage.session_id == session_id).all()
+    if not await row_exists(db, ChatSession.id == session_id, ChatSession.user_id == current_user_id):
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    messages = (await db.scalars(
+        paginate(select(ChatMessage).where(ChatMessage.session_id == session_id), ChatMessage.id, limit, cursor)
+    )).all()
+    return paged_list_response(CHAT_MESSAGE_LIST_ADAPTER, messages, limit)
+
+async def load_chat_history(db: AsyncSession, session_id: Optional[int], user_id: int) -> List[Dict]:
+    """Last few messages of one of the user's chat sessions, oldest first; 404 for anyone else's
+    session, since the answer is then stored in it"""
+    if not session_id:
+        return []
+    if not await row_exists(db, ChatSession.id == session_id, ChatSession.user_id == user_id):
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    messages = (await db.scalars(select(ChatMessage).where(
+        ChatMessage.session_id == session_id
+    ).order_by(ChatMessage.timestamp.desc()).limit(6))).all()
+    return [
+        {"role": msg.role, "content": msg.content} 
+        for msg in reversed(messages)
+    ]
+
+def chat_exchange(session_id: int, question: str, result: Dict) -> List[ChatMessage]:
+    """User and assistant messages recording one answered question"""
+    return [
+        ChatMessage(
+            session_id=session_id,
+            role="user",
+            content=question
+        ),
+        ChatMessage(
+            session_id=session_id,
+            role="assistant",
+            content=result["answer"],
+            context={"sources": result["sources"], "num_sources": result["num_sources"]}
+        )
+    ]
 
 # Q&A endpoint with RAG
 @app.post("/chat/ask", response_model=QuestionAnswerResponse)
-def ask_question(
+async def ask_question(
     request: QuestionAnswerRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
+    # Get chat history if session_id provided (outside the try, so a foreign session is a 404)
+    chat_history = await load_chat_history(db, request.session_id, current_user_id)
+    
     try:
-        # Get chat history if session_id provided
-        chat_history = []
-        if request.session_id:
-            session = db.query(ChatSession).filter(
-                ChatSession.id == request.session_id, 
-                ChatSession.user_id == current_user.id
-            ).first()
-            if session:
-                messages = db.query(ChatMessage).filter(
-                    ChatMessage.session_id == request.session_id
-                ).order_by(ChatMessage.timestamp.desc()).limit(6).all()
-                chat_history = [
-                    {"role": msg.role, "content": msg.content} 
-                    for msg in reversed(messages)
-                ]
-        
-        # Use RAG to get answer
-        result = rag_processor.answer_with_context(
+        # Use RAG to get answer; the LLM call blocks, so it runs off the event loop
+        result = await asyncio.to_thread(
+            rag_processor.answer_with_context,
             query=request.question,
             llm_processor=llm_processor,
             paper_id=request.paper_id,
-            chat_history=chat_history
+            chat_history=chat_history,
+            user_id=current_user_id
         )
         
         # Store the conversation if session_id provided
         if request.session_id:
-            # Store user message
-            user_message = ChatMessage(
-                session_id=request.session_id,
-                role="user",
-                content=request.question
-            )
-            db.add(user_message)
-            
-            # Store assistant message
-            assistant_message = ChatMessage(
-                session_id=request.session_id,
-                role="assistant",
-                content=result["answer"],
-                context={"sources": result["sources"], "num_sources": result["num_sources"]}
-            )
-            db.add(assistant_message)
-            db.commit()
+            db.add_all(chat_exchange(request.session_id, request.question, result))
+            await db.commit()
         
         return QuestionAnswerResponse(
             answer=result["answer"],
@@ -572,55 +869,111 @@ def ask_question(
             sources=[]
         )
 
-# Insights endpoints
-@app.get("/insights", response_model=List[InsightSchema])
-def get_insights(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    insights = db.query(Insight).filter(Insight.user_id == current_user.id).all()
+@app.post("/chat/ask/stream")
+async def ask_question_stream(
+    request: QuestionAnswerRequest,
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """Server-sent events version of /chat/ask: token events as the answer is generated,
+    then a final event with the full answer, context and sources"""
+    chat_history = await load_chat_history(db, request.session_id, current_user_id)
     
-    # Process insights to handle JSON fields properly
-    processed_insights = []
-    for insight in insights:
-        # Parse related_papers JSON if it's a string
-        related_papers = insight.related_papers
-        if isinstance(related_papers, str):
-            try:
-                related_papers = json.loads(related_papers)
-            except (json.JSONDecodeError, TypeError):
-                related_papers = []
-        elif related_papers is None:
-            related_papers = []
+    async def event_generator():
+        events = rag_processor.stream_answer_with_context(
+            query=request.question,
+            llm_processor=llm_processor,
+            paper_id=request.paper_id,
+            chat_history=chat_history,
+            user_id=current_user_id
+        )
+        result = None
+        try:
+            # Retrieval and the LLM stream block, so each step runs off the event loop
+            while (event := await anyio.to_thread.run_sync(next, events, None)) is not None:
+                if "token" in event:
+                    yield b"data: " + orjson.dumps({"token": event["token"]}) + b"\n\n"
+                else:
+                    result = event
+        except Exception as e:
+            yield b"data: " + orjson.dumps({
+                "done": True,
+                "answer": f"Error processing question: {str(e)}",
+                "context": [],
+                "sources": []
+            }) + b"\n\n"
+            return
+        
+        # Both messages are stored in one commit once the answer is complete
+        if request.session_id:
+            async with ApiSessionLocal() as session_db:
+                session_db.add_all(chat_exchange(request.session_id, request.question, result))
+                await session_db.commit()
         
-        # Create processed insight
-        processed_insight = {
-            "id": insight.id,
-            "title": insight.title,
-            "content": insight.content,
-            "type": insight.type,
-            "relevance_score": insight.relevance_score,
-            "related_papers": related_papers,
-            "user_id": insight.user_id,
-            "created_at": insight.created_at,
-            "is_read": insight.is_read
-        }
-        processed_insights.append(processed_insight)
+        yield b"data: " + orjson.dumps({
+            "done": True,
+            "answer": result["answer"],
+            "context": result["context"],
+            "sources": result["sources"]
+        }) + b"\n\n"
     
-    return processed_insights
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+# Insights endpoints
+@app.get("/insights", response_model=List[InsightSchema])
+async def get_insights(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    insights = (await db.scalars(paginate(select(Insight).where(Insight.user_id == current_user_id), Insight.id, limit, cursor))).all()
+    return paged_list_response(INSIGHT_LIST_ADAPTER, insights, limit, request)
 
 @app.post("/insights/{insight_id}/read")
-def mark_insight_read(insight_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    insight = db.query(Insight).filter(Insight.id == insight_id, Insight.user_id == current_user.id).first()
+async def mark_insight_read(insight_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    insight = await db.scalar(select(Insight).where(Insight.id == insight_id, Insight.user_id == current_user_id))
     if not insight:
         raise HTTPException(status_code=404, detail="Insight not found")
     
     insight.is_read = True
-    db.commit()
+    await db.commit()
     return {"message": "Insight marked as read"}
 
+# Batch endpoint
+# Sub-requests are dispatched to this app in-process, so they go through routing, auth and
+# validation exactly as separate calls would, without the extra network round trips
+batch_transport = httpx.ASGITransport(app=app)
+
+@app.post("/batch", response_model=BatchResponse)
+async def run_batch(request: BatchRequest, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Run several API calls in one round trip, e.g. the dashboard's initial loads"""
+    if len(request.requests) > MAX_BATCH_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_REQUESTS} requests per batch")
+    
+    headers = {"Authorization": f"Bearer {credentials.credentials}"}
+    async with httpx.AsyncClient(transport=batch_transport, base_url="http://batch") as client:
+        async def handle(item):
+            # Judge the path the app will route, which httpx percent-decodes ("/%62atch" is /batch)
+            try:
+                path = httpx.URL(item.url).path
+            except httpx.InvalidURL:
+                path = ""
+            if not item.url.startswith("/") or item.url.startswith("//") or path.startswith("/batch"):
+                return BatchResponseItem(id=item.id, status=400, body={"detail": "Invalid batch url"})
+            response = await client.request(item.method, item.url, headers=headers, json=item.body)
+            is_json = response.headers.get("content-type", "").startswith("application/json")
+            return BatchResponseItem(
+                id=item.id,
+                status=response.status_code,
+                body=response.json() if is_json else response.text
+            )
+        
+        responses = await asyncio.gather(*(handle(item) for item in request.requests))
+    return BatchResponse(responses=responses)
+
 # Health check
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
-
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
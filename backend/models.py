@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, JSON
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, JSON, LargeBinary, Float, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
 Base = declarative_base()
@@ -32,8 +32,9 @@ class Paper(Base):
     full_text = Column(Text)
     file_path = Column(String)
     file_size = Column(Integer)
+    content_sha256 = Column(String, index=True)  # hash of the uploaded PDF bytes
     upload_date = Column(DateTime, default=datetime.utcnow)
-    owner_id = Column(Integer, ForeignKey("users.id"))
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
     status = Column(String, default="processing")  # processing, ready, error
     paper_metadata = Column(JSON)  # Renamed from 'metadata' to avoid conflict
     
@@ -48,11 +49,11 @@ class Note(Base):
     __tablename__ = "notes"
     
     id = Column(Integer, primary_key=True, index=True)
-    paper_id = Column(Integer, ForeignKey("papers.id"))
+    paper_id = Column(Integer, ForeignKey("papers.id"), index=True)
     title = Column(String)
-    content = Column(Text)
+    content = Column(JSON().with_variant(JSONB, "postgresql"))  # structured study notes, or plain text
     summary = Column(Text)
-    key_takeaways = Column(JSON)
+    key_takeaways = Column(JSON().with_variant(JSONB, "postgresql"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
     
@@ -63,7 +64,7 @@ class Flashcard(Base):
     __tablename__ = "flashcards"
     
     id = Column(Integer, primary_key=True, index=True)
-    paper_id = Column(Integer, ForeignKey("papers.id"))
+    paper_id = Column(Integer, ForeignKey("papers.id"), index=True)
     question = Column(Text)
     answer = Column(Text)
     difficulty = Column(String, default="medium")
@@ -77,7 +78,7 @@ class MindMap(Base):
     __tablename__ = "mind_maps"
     
     id = Column(Integer, primary_key=True, index=True)
-    paper_id = Column(Integer, ForeignKey("papers.id"))
+    paper_id = Column(Integer, ForeignKey("papers.id"), index=True)
     title = Column(String)
     structure = Column(JSON)  # JSON structure for frontend visualization
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -89,7 +90,7 @@ class StudyPlan(Base):
     __tablename__ = "study_plans"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     title = Column(String)
     description = Column(Text)
     goal = Column(Text)
@@ -108,7 +109,7 @@ class StudySession(Base):
     __tablename__ = "study_sessions"
     
     id = Column(Integer, primary_key=True, index=True)
-    plan_id = Column(Integer, ForeignKey("study_plans.id"))
+    plan_id = Column(Integer, ForeignKey("study_plans.id"), index=True)
     title = Column(String)
     description = Column(Text)
     scheduled_date = Column(DateTime)
@@ -123,8 +124,8 @@ class ChatSession(Base):
     __tablename__ = "chat_sessions"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    paper_id = Column(Integer, ForeignKey("papers.id"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    paper_id = Column(Integer, ForeignKey("papers.id"), nullable=True, index=True)
     title = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
@@ -136,6 +137,10 @@ class ChatSession(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    # Chat history reads a session's latest messages: WHERE session_id = ? ORDER BY timestamp DESC LIMIT n
+    __table_args__ = (
+        Index("ix_chat_messages_session_id_timestamp", "session_id", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("chat_sessions.id"))
@@ -151,7 +156,7 @@ class Insight(Base):
     __tablename__ = "insights"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     title = Column(String)
     content = Column(Text)
     type = Column(String)  # novel_finding, contradiction, trend, gap
@@ -159,3 +164,13 @@ class Insight(Base):
     related_papers = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
     is_read = Column(Boolean, default=False)
+
+class EmbeddingCache(Base):
+    __tablename__ = "embedding_cache"
+    
+    # Keyed by model as well as content so switching models never returns stale vectors
+    model = Column(String, primary_key=True)
+    sha256 = Column(String, primary_key=True)
+    dim = Column(Integer)
+    vector = Column(LargeBinary)  # int8 codes, or float32 bytes for rows written before quantization
+    scale = Column(Float)  # dequantization scale; NULL for float32 rows
@@ -1,10 +1,53 @@
 import pdfplumber
 import fitz  # PyMuPDF
+import io
 import os
 import re
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
+# Patterns are compiled once at import instead of on every call (and every loop iteration)
+_TITLE_PATTERNS = [
+    re.compile(r'^([A-Z][^.!?]*[.!?]?)$'),  # Title case sentences
+    re.compile(r'^([A-Z][A-Z\s]+)$'),        # All caps
+    re.compile(r'^(.{10,100})$')              # Reasonable length
+]
+
+_AUTHOR_PATTERNS = [
+    re.compile(r'^([A-Z][a-z]+ [A-Z][a-z]+(?:, [A-Z][a-z]+ [A-Z][a-z]+)*)'),
+    re.compile(r'^([A-Z]\. [A-Z][a-z]+(?:, [A-Z]\. [A-Z][a-z]+)*)'),
+    re.compile(r'(?:Authors?|By):?\s*([A-Z][^.!?]*)'),
+]
+
+# The abstract header is found first and its end searched for from there, rather than
+# expanding a lazy DOTALL match one character at a time against a lookahead
+_ABSTRACT_HEADER_RE = re.compile(r'(?:Abstract|Summary)[:\s]+', re.IGNORECASE)
+_ABSTRACT_END_RE = re.compile(r'\n\n|\nKeywords?|\nIntroduction|\n1\.', re.IGNORECASE)
+
+# Common section patterns
+_SECTION_PATTERNS = [
+    re.compile(r'\n(\d+\.?\s+[A-Z][^.!?]*[.!?]?)\n', re.IGNORECASE),
+    re.compile(r'\n([A-Z][A-Z\s]+)\n', re.IGNORECASE),
+    re.compile(r'\n(Introduction|Method|Results|Discussion|Conclusion|References)[:\s]*\n', re.IGNORECASE),
+]
+
+# All section patterns merged into one alternation so the text is swept once
+_SECTION_RE = re.compile("|".join(f"(?:{p.pattern})" for p in _SECTION_PATTERNS), re.IGNORECASE)
+
+# Text without any of these words is not treated as a structured paper
+_SECTION_KEYWORDS = ("Introduction", "Method", "Results", "Discussion", "Conclusion", "References")
+_SECTION_KEYWORD_RE = re.compile("|".join(_SECTION_KEYWORDS), re.IGNORECASE)
+
+def _has_year(text: str) -> bool:
+    """Whether text contains a run of four digits"""
+    run = 0
+    for char in text:
+        run = run + 1 if char.isdigit() else 0
+        if run == 4:
+            return True
+    return False
+
 @dataclass
 class ExtractedPaper:
     title: str
@@ -16,83 +59,105 @@ class ExtractedPaper:
 
 class PDFProcessor:
     def __init__(self):
-        self.title_patterns = [
-            r'^([A-Z][^.!?]*[.!?]?)$',  # Title case sentences
-            r'^([A-Z][A-Z\s]+)$',        # All caps
-            r'^(.{10,100})$'              # Reasonable length
-        ]
+        self.title_patterns = _TITLE_PATTERNS
         
     def extract_paper_content(self, file_path: str) -> ExtractedPaper:
-        """Extract content from PDF using pdfplumber and PyMuPDF"""
+        """Extract content from PDF using PyMuPDF, falling back to pdfplumber"""
+        try:
+            # The file is read once; both parsers work on the bytes in memory
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            
+            # Text and metadata come from one PyMuPDF parse of the document
+            try:
+                with fitz.open(stream=data, filetype="pdf") as doc:
+                    pages_text = self._pages_text(page.get_text("text") for page in doc)
+                    metadata = self._metadata_from_doc(doc)
+            except Exception:
+                with pdfplumber.open(io.BytesIO(data)) as pdf:
+                    pages_text = self._pages_text(page.extract_text() for page in pdf.pages)
+                metadata = None
+        except Exception as e:
+            raise Exception(f"Error processing PDF: {str(e)}")
+        
+        # Title, authors, abstract and sections are pure text work outside the parsing try
+        return self.assemble_paper(file_path, pages_text, metadata)
+    
+    def extract_pages_text(self, file_path: str, start: int, end: int) -> List[str]:
+        """Text of pages [start, end) (0-based), skipping pages without text"""
         try:
-            # Use pdfplumber for text extraction
-            with pdfplumber.open(file_path) as pdf:
-                full_text = ""
-                pages_text = []
-                
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        pages_text.append(page_text)
-                        full_text += page_text + "\n"
-                
-                # Extract metadata using PyMuPDF
-                metadata = self._extract_metadata_pymupdf(file_path)
-                
-                # Extract structured content
-                title = self._extract_title(pages_text, metadata)
-                authors = self._extract_authors(pages_text, metadata)
-                abstract = self._extract_abstract(pages_text)
-                sections = self._extract_sections(pages_text)
-                
-                return ExtractedPaper(
-                    title=title,
-                    authors=authors,
-                    abstract=abstract,
-                    full_text=full_text,
-                    metadata=metadata,
-                    sections=sections
-                )
-                
+            try:
+                with fitz.open(file_path) as doc:
+                    return self._pages_text(doc[i].get_text("text") for i in range(start, min(end, len(doc))))
+            except Exception:
+                with pdfplumber.open(file_path, pages=list(range(start + 1, end + 1))) as pdf:
+                    return self._pages_text(page.extract_text() for page in pdf.pages)
         except Exception as e:
             raise Exception(f"Error processing PDF: {str(e)}")
     
+    def assemble_paper(self, file_path: str, pages_text: List[str], metadata: Optional[Dict] = None) -> ExtractedPaper:
+        """Build the extracted paper from its page texts"""
+        full_text = "".join(page_text + "\n" for page_text in pages_text)
+        
+        # Extract metadata using PyMuPDF, unless the caller already read it
+        if metadata is None:
+            metadata = self._extract_metadata_pymupdf(file_path)
+        
+        # Extract structured content
+        first_page = pages_text[0] if pages_text else ""
+        title = self._extract_title(first_page, metadata)
+        authors = self._extract_authors(first_page, metadata)
+        abstract = self._extract_abstract(pages_text)
+        sections = self._extract_sections(full_text)
+        
+        return ExtractedPaper(
+            title=title,
+            authors=authors,
+            abstract=abstract,
+            full_text=full_text,
+            metadata=metadata,
+            sections=sections
+        )
+    
+    def _pages_text(self, page_texts) -> List[str]:
+        return [page_text for page_text in page_texts if page_text and page_text.strip()]
+    
     def _extract_metadata_pymupdf(self, file_path: str) -> Dict:
         """Extract metadata using PyMuPDF"""
         try:
-            doc = fitz.open(file_path)
-            metadata = doc.metadata
-            doc.close()
-            
-            return {
-                'title': metadata.get('title', ''),
-                'author': metadata.get('author', ''),
-                'subject': metadata.get('subject', ''),
-                'creator': metadata.get('creator', ''),
-                'producer': metadata.get('producer', ''),
-                'creation_date': metadata.get('creationDate', ''),
-                'modification_date': metadata.get('modDate', ''),
-                'pages': len(doc) if doc else 0
-            }
+            with fitz.open(file_path) as doc:
+                return self._metadata_from_doc(doc)
         except Exception as e:
             return {'error': str(e)}
     
-    def _extract_title(self, pages_text: List[str], metadata: Dict) -> str:
+    def _metadata_from_doc(self, doc) -> Dict:
+        metadata = doc.metadata or {}
+        return {
+            'title': metadata.get('title', ''),
+            'author': metadata.get('author', ''),
+            'subject': metadata.get('subject', ''),
+            'creator': metadata.get('creator', ''),
+            'producer': metadata.get('producer', ''),
+            'creation_date': metadata.get('creationDate', ''),
+            'modification_date': metadata.get('modDate', ''),
+            'pages': len(doc)
+        }
+    
+    def _extract_title(self, first_page: str, metadata: Dict) -> str:
         """Extract paper title from first page or metadata"""
         # Try metadata first
         if metadata.get('title') and len(metadata['title']) > 3:
             return metadata['title'].strip()
         
         # Try extracting from first page
-        if not pages_text:
+        if not first_page:
             return "Unknown Title"
         
-        first_page = pages_text[0]
-        lines = first_page.split('\n')
+        # Only the first few lines are looked at, so split and strip just those
+        lines = [line.strip() for line in first_page.split('\n', 10)[:10]]
         
         # Look for title patterns in first few lines
-        for i, line in enumerate(lines[:10]):
-            line = line.strip()
+        for line in lines:
             if len(line) > 10 and len(line) < 200:
                 # Check if it looks like a title
                 if self._is_likely_title(line):
@@ -100,35 +165,27 @@ class PDFProcessor:
         
         # Fallback to first substantial line
         for line in lines[:5]:
-            line = line.strip()
             if len(line) > 10:
                 return line
         
         return "Unknown Title"
     
-    def _extract_authors(self, pages_text: List[str], metadata: Dict) -> str:
+    def _extract_authors(self, first_page: str, metadata: Dict) -> str:
         """Extract authors from paper"""
         # Try metadata first
         if metadata.get('author') and len(metadata['author']) > 2:
             return metadata['author'].strip()
         
-        if not pages_text:
+        if not first_page:
             return "Unknown Authors"
         
-        first_page = pages_text[0]
-        lines = first_page.split('\n')
+        lines = first_page.split('\n', 20)[:20]
         
         # Look for author patterns
-        author_patterns = [
-            r'^([A-Z][a-z]+ [A-Z][a-z]+(?:, [A-Z][a-z]+ [A-Z][a-z]+)*)',
-            r'^([A-Z]\. [A-Z][a-z]+(?:, [A-Z]\. [A-Z][a-z]+)*)',
-            r'(?:Authors?|By):?\s*([A-Z][^.!?]*)',
-        ]
-        
-        for line in lines[:20]:
+        for line in lines:
             line = line.strip()
-            for pattern in author_patterns:
-                match = re.search(pattern, line)
+            for pattern in _AUTHOR_PATTERNS:
+                match = pattern.search(line)
                 if match:
                     return match.group(1).strip()
         
@@ -140,67 +197,49 @@ class PDFProcessor:
             return ""
         
         # Look in first few pages
-        text_to_search = ""
+        parts = []
+        searched_length = 0
         for i, page in enumerate(pages_text[:3]):
-            text_to_search += page + "\n"
-            if i > 0 and len(text_to_search) > 5000:  # Don't search too far
+            parts.append(page)
+            searched_length += len(page) + 1
+            if i > 0 and searched_length > 5000:  # Don't search too far
                 break
+        text_to_search = "\n".join(parts) + "\n"
         
-        # Abstract patterns
-        abstract_patterns = [
-            r'Abstract[:\s]+(.*?)(?=\n\n|\nKeywords?|\nIntroduction|\n1\.)',
-            r'ABSTRACT[:\s]+(.*?)(?=\n\n|\nKEYWORDS?|\nINTRODUCTION|\n1\.)',
-            r'Summary[:\s]+(.*?)(?=\n\n|\nKeywords?|\nIntroduction|\n1\.)',
-        ]
-        
-        for pattern in abstract_patterns:
-            match = re.search(pattern, text_to_search, re.DOTALL | re.IGNORECASE)
-            if match:
-                abstract = match.group(1).strip()
+        # Abstract runs from its header to the first blank line, keywords or introduction
+        for header in _ABSTRACT_HEADER_RE.finditer(text_to_search):
+            end = _ABSTRACT_END_RE.search(text_to_search, header.end())
+            if end:
+                abstract = text_to_search[header.end():end.start()].strip()
                 # Clean up the abstract
-                abstract = re.sub(r'\s+', ' ', abstract)
+                abstract = ' '.join(abstract.split())
                 if len(abstract) > 50 and len(abstract) < 2000:
                     return abstract
         
         return ""
     
-    def _extract_sections(self, pages_text: List[str]) -> List[Dict]:
+    def _extract_sections(self, full_text: str) -> List[Dict]:
         """Extract paper sections"""
         sections = []
-        full_text = "\n".join(pages_text)
+        if not _SECTION_KEYWORD_RE.search(full_text):
+            return sections
         
-        # Common section patterns
-        section_patterns = [
-            r'\n(\d+\.?\s+[A-Z][^.!?]*[.!?]?)\n',
-            r'\n([A-Z][A-Z\s]+)\n',
-            r'\n(Introduction|Method|Results|Discussion|Conclusion|References)[:\s]*\n',
-        ]
-        
-        for pattern in section_patterns:
-            matches = re.finditer(pattern, full_text, re.IGNORECASE)
-            for match in matches:
-                section_title = match.group(1).strip()
-                start_pos = match.end()
-                
-                # Find next section or end of text
-                next_match = None
-                for next_pattern in section_patterns:
-                    next_matches = re.finditer(next_pattern, full_text[start_pos:], re.IGNORECASE)
-                    for next_match_candidate in next_matches:
-                        if next_match is None or next_match_candidate.start() < next_match.start():
-                            next_match = next_match_candidate
-                        break
-                
-                if next_match:
-                    section_content = full_text[start_pos:start_pos + next_match.start()]
-                else:
-                    section_content = full_text[start_pos:start_pos + 2000]  # Limit section length
-                
-                sections.append({
-                    'title': section_title,
-                    'content': section_content.strip(),
-                    'start_pos': start_pos
-                })
+        # Each section runs from its header to the next header, in document order
+        matches = list(_SECTION_RE.finditer(full_text))
+        for i, match in enumerate(matches):
+            section_title = match.group(match.lastindex).strip()
+            start_pos = match.end()
+            
+            if i + 1 < len(matches):
+                section_content = full_text[start_pos:matches[i + 1].start()]
+            else:
+                section_content = full_text[start_pos:start_pos + 2000]  # Limit section length
+            
+            sections.append({
+                'title': section_title,
+                'content': section_content.strip(),
+                'start_pos': start_pos
+            })
         
         return sections
     
@@ -215,8 +254,8 @@ class PDFProcessor:
             text[0].isupper(),  # Starts with capital
             not text.endswith('.'),  # Doesn't end with period
             text.count(' ') > 1,  # Multiple words
-            not re.search(r'\d{4}', text),  # No years
-            not re.search(r'@|\.com|\.org', text),  # No emails/URLs
+            not _has_year(text),  # No years
+            '@' not in text and '.com' not in text and '.org' not in text,  # No emails/URLs
         ]
         
         return sum(title_indicators) >= 3
@@ -254,7 +293,28 @@ class PDFProcessor:
         
         return chunks
 
+@lru_cache(maxsize=1)
+def _get_processor() -> PDFProcessor:
+    """One shared PDFProcessor per process; it holds no per-paper state"""
+    return PDFProcessor()
+
 def process_uploaded_paper(file_path: str) -> ExtractedPaper:
     """Main function to process uploaded PDF"""
-    processor = PDFProcessor()
-    return processor.extract_paper_content(file_path)
+    return _get_processor().extract_paper_content(file_path)
+
+def pdf_page_count(file_path: str) -> int:
+    """Number of pages in a PDF, read without extracting any text"""
+    with fitz.open(file_path) as doc:
+        return len(doc)
+
+def process_uploaded_paper_pages(file_path: str, start: int, end: int) -> List[str]:
+    """Extract the text of one page range, for sharding a large PDF across processes"""
+    return _get_processor().extract_pages_text(file_path, start, end)
+
+def assemble_extracted_paper(file_path: str, pages_text: List[str]) -> ExtractedPaper:
+    """Combine page texts extracted in shards into the same result process_uploaded_paper gives"""
+    return _get_processor().assemble_paper(file_path, pages_text)
+
+def warm_extraction_worker() -> None:
+    """Run in a pool worker ahead of the first paper so it has imported this module and built its processor"""
+    _get_processor()
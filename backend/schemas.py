@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, ConfigDict, EmailStr
+from typing import Optional, List, Dict, Any, Literal, Union
 from datetime import datetime
 
 # User schemas
@@ -21,8 +21,7 @@ class User(UserBase):
     is_active: bool
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Paper schemas
 class PaperBase(BaseModel):
@@ -42,13 +41,12 @@ class Paper(PaperBase):
     status: str
     paper_metadata: Optional[Dict[str, Any]] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Note schemas
 class NoteBase(BaseModel):
     title: str
-    content: str
+    content: Union[str, Dict[str, Any]]
     summary: Optional[str] = None
     key_takeaways: Optional[List[str]] = None
 
@@ -61,8 +59,7 @@ class Note(NoteBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Flashcard schemas
 class FlashcardBase(BaseModel):
@@ -79,8 +76,7 @@ class Flashcard(FlashcardBase):
     paper_id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Mind Map schemas
 class MindMapBase(BaseModel):
@@ -95,8 +91,7 @@ class MindMap(MindMapBase):
     paper_id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Study Plan schemas
 class StudyPlanBase(BaseModel):
@@ -117,8 +112,7 @@ class StudyPlan(StudyPlanBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Study Session schemas
 class StudySessionBase(BaseModel):
@@ -136,8 +130,7 @@ class StudySession(StudySessionBase):
     completed_date: Optional[datetime] = None
     status: str
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Chat schemas
 class ChatSessionBase(BaseModel):
@@ -153,8 +146,7 @@ class ChatSession(ChatSessionBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ChatMessageBase(BaseModel):
     role: str
@@ -169,8 +161,7 @@ class ChatMessage(ChatMessageBase):
     session_id: int
     timestamp: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Insight schemas
 class InsightBase(BaseModel):
@@ -189,8 +180,7 @@ class Insight(InsightBase):
     created_at: datetime
     is_read: bool
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # API Response schemas
 class Token(BaseModel):
@@ -209,3 +199,20 @@ class QuestionAnswerResponse(BaseModel):
     answer: str
     context: Optional[List[str]] = None
     sources: Optional[List[str]] = None
+
+class BatchRequestItem(BaseModel):
+    id: str
+    url: str
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"] = "GET"
+    body: Optional[Any] = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchRequestItem]
+
+class BatchResponseItem(BaseModel):
+    id: str
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchResponseItem]
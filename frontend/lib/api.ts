@@ -31,7 +31,7 @@ export interface Note {
   id: number
   paper_id: number
   title: string
-  content: string
+  content: string | Record<string, any>
   summary: string | null
   key_takeaways: string[] | null
   created_at: string
@@ -106,6 +106,19 @@ export interface QuestionAnswerResponse {
   sources: string[]
 }
 
+export interface BatchRequestItem {
+  id: string
+  url: string
+  method?: 'GET' | 'POST' | 'PUT' | 'PATCH' | 'DELETE'
+  body?: any
+}
+
+export interface BatchResponseItem {
+  id: string
+  status: number
+  body: any
+}
+
 // API utility functions
 class ApiClient {
   private token: string | null = null
@@ -345,6 +358,15 @@ class ApiClient {
     })
   }
 
+  // Batch: several calls in one round trip
+  async batch(requests: BatchRequestItem[]): Promise<BatchResponseItem[]> {
+    const result = await this.request<{ responses: BatchResponseItem[] }>('/batch', {
+      method: 'POST',
+      body: JSON.stringify({ requests }),
+    })
+    return result.responses
+  }
+
   // Health check
   async healthCheck(): Promise<{ status: string; timestamp: string }> {
     return this.request<{ status: string; timestamp: string }>('/health')